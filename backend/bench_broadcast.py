@@ -0,0 +1,68 @@
+import asyncio
+import json
+import sys
+import time
+from broadcast import BroadcastHub
+
+# Usage: python bench_broadcast.py [num_clients] [slow_fraction]
+num_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+slow_fraction = float(sys.argv[2]) if len(sys.argv) > 2 else 0.1
+num_updates = 20
+update_interval = 0.02
+fast_delay = 0.001 # Simulated network time per send
+slow_delay = 0.2
+
+class FakeClient:
+    def __init__(self, delay):
+        self.delay = delay
+        self.latencies = []
+
+    async def send_text(self, frame):
+        await asyncio.sleep(self.delay)
+        sent_at = json.loads(frame)["data"]["sent_at"]
+        self.latencies.append(time.perf_counter() - sent_at)
+
+    send_bytes = send_text
+
+def p99(values):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * 0.99))] * 1000 if values else 0.0
+
+def make_clients():
+    num_slow = int(num_clients * slow_fraction)
+    return [FakeClient(slow_delay if i < num_slow else fast_delay) for i in range(num_clients)]
+
+def state(i):
+    return {"seq": i, "sent_at": time.perf_counter(), "files": [{"path": f"/docs/f{j}.txt"} for j in range(200)]}
+
+async def run_sequential(clients):
+    # Previous behaviour: await each client in turn for every update
+    for i in range(num_updates):
+        message = json.dumps({"type": "state", "data": state(i)})
+        for client in clients:
+            await client.send_text(message)
+        await asyncio.sleep(update_interval)
+
+async def run_hub(clients):
+    hub = BroadcastHub()
+    for client in clients:
+        hub.register(client)
+    for i in range(num_updates):
+        hub.publish_state(state(i))
+        await asyncio.sleep(update_interval)
+    await asyncio.sleep(slow_delay * 2) # Let the last states drain
+    for client in clients:
+        hub.unregister(client)
+
+def report(name, clients, elapsed):
+    fast = [l for c in clients if c.delay == fast_delay for l in c.latencies]
+    slow = [l for c in clients if c.delay == slow_delay for l in c.latencies]
+    delivered = sum(len(c.latencies) for c in clients)
+    print(f"{name:>10}: {elapsed:.2f}s total, {delivered} frames, "
+          f"p99 fast clients {p99(fast):.1f} ms, p99 slow clients {p99(slow):.1f} ms")
+
+for name, runner in (("sequential", run_sequential), ("hub", run_hub)):
+    clients = make_clients()
+    start = time.perf_counter()
+    asyncio.run(runner(clients))
+    report(name, clients, time.perf_counter() - start)
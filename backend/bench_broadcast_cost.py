@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import time
+from graph import file_row
+
+# Usage: python bench_broadcast_cost.py [num_files]
+num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+words = "quarterly revenue forecast pipeline contract invoice research summary".split()
+
+with tempfile.TemporaryDirectory() as root:
+    labels, contents, meta, info = {}, {}, {}, {}
+    for i in range(num_files):
+        path = os.path.join(root, f"doc_{i}.txt")
+        text = " ".join(words[(i + j) % len(words)] for j in range(2000))
+        with open(path, "w") as f:
+            f.write(text)
+        st = os.stat(path)
+        labels[path] = i % 50
+        contents[path] = text
+        meta[path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        info[path] = {"keywords": words[:3], "confidence": 0.9, "preview": text[:200] + "..."}
+
+    start = time.time()
+    # Old behaviour: stat every file and split its full text for keywords
+    old_rows = []
+    for path, label in labels.items():
+        try:
+            stat = os.stat(path)
+            size = stat.st_size
+            modified_at = stat.st_mtime
+            ext_str = str(os.path.splitext(str(path))[1])
+            ext = ext_str.upper().replace('.', '') if ext_str else 'FILE'
+        except:
+            size = 0
+            modified_at = 0
+            ext = "UNKNOWN"
+        content = contents.get(path, "")
+        keywords = [w.lower() for w in content.split() if len(w) > 4][:3]
+        old_rows.append({
+            "path": path,
+            "name": os.path.basename(path),
+            "cluster": int(label),
+            "content": content[:200] + "...",
+            "size": f"{size / 1024 / 1024:.1f} MB" if size > 1024*1024 else f"{size / 1024:.1f} KB",
+            "modified": modified_at,
+            "type": ext,
+            "keywords": keywords,
+            "confidence": 0.85
+        })
+    old = time.time() - start
+
+    start = time.time()
+    new_rows = [file_row(path, label, info.get(path), meta.get(path)) for path, label in labels.items()]
+    new = time.time() - start
+
+    print(f"stat + split loop: {len(old_rows)} files in {old * 1000:.0f} ms")
+    print(f"cached file_row loop: {len(new_rows)} files in {new * 1000:.0f} ms ({old / max(new, 1e-9):.1f}x)")
@@ -0,0 +1,30 @@
+import json
+import sys
+import time
+import numpy as np
+from graph import build_cluster_graph, cluster_summary, file_page
+
+# Usage: python bench_graph.py [num_files ...]
+sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000]
+dim = 384
+
+for n in sizes:
+    rng = np.random.default_rng(0)
+    n_clusters = max(2, int(np.sqrt(n)))
+    centers = rng.normal(size=(n_clusters, dim))
+    labels = rng.integers(0, n_clusters, size=n)
+    embeddings = centers[labels] + 0.3 * rng.normal(size=(n, dim))
+    files = [f"/docs/Topic_{labels[i]}/doc_{i}.txt" for i in range(n)]
+    names = {c: f"Topic_{c}" for c in range(n_clusters)}
+    info = {f: {"preview": "x" * 200, "keywords": ["a", "b", "c"], "confidence": 0.9} for f in files}
+
+    start = time.time()
+    graph = build_cluster_graph(files, embeddings, labels, names)
+    build = time.time() - start
+
+    summary = json.dumps(cluster_summary(graph, 0, 200))
+    start = time.time()
+    page = json.dumps(file_page(graph, int(labels[0]), info, 0, 100))
+    expand = time.time() - start
+    print(f"{n:>7} files, {n_clusters:>4} clusters: build {build:.2f}s, "
+          f"summary {len(summary) / 1024:.0f} KB, expand {expand * 1000:.0f} ms / {len(page) / 1024:.0f} KB")
@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from mover import MoveEngine
+
+# Usage: python bench_moves.py [num_files]
+num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+num_folders = 100
+
+def make_tree(root):
+    for i in range(num_files):
+        with open(os.path.join(root, f"doc_{i}.txt"), "w") as f:
+            f.write(f"document {i}")
+    return [(os.path.join(root, f"doc_{i}.txt"),
+             os.path.join(root, f"Topic_{i % num_folders}", f"doc_{i}.txt"))
+            for i in range(num_files)]
+
+with tempfile.TemporaryDirectory() as root:
+    moves = make_tree(root)
+    start = time.time()
+    # Old behaviour: exists/makedirs + shutil.move per file
+    for src, dst in moves:
+        target_dir = os.path.dirname(dst)
+        if not os.path.exists(target_dir):
+            os.makedirs(target_dir)
+        shutil.move(src, dst)
+    print(f"shutil.move loop: {num_files} files in {time.time() - start:.2f}s")
+
+with tempfile.TemporaryDirectory() as root:
+    moves = make_tree(root)
+    engine = MoveEngine(journal_path=os.path.join(tempfile.gettempdir(), "bench_moves.journal"))
+    start = time.time()
+    done = engine.move_batch(moves)
+    print(f"MoveEngine batch: {len(done)} files in {time.time() - start:.2f}s (journaled)")
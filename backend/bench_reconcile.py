@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import time
+from reconcile import scan_tree, diff_state
+
+# Usage: python bench_reconcile.py [num_files]
+num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+files_per_folder = 500
+
+with tempfile.TemporaryDirectory() as root:
+    print(f"Creating {num_files} files under {root}...")
+    for i in range(num_files):
+        folder = os.path.join(root, f"Topic_{i // files_per_folder}")
+        if i % files_per_folder == 0:
+            os.makedirs(folder)
+        with open(os.path.join(folder, f"doc_{i}.txt"), "w") as f:
+            f.write(f"document {i}")
+
+    start = time.time()
+    stored = scan_tree(root)
+    print(f"Initial scan: {len(stored)} files in {time.time() - start:.2f}s")
+
+    # Simulate downtime: touch 1% of files, delete 1%, add 1%
+    paths = sorted(stored)
+    step = 100
+    for path in paths[::step]:
+        with open(path, "a") as f:
+            f.write(" edited")
+    for path in paths[1::step]:
+        os.remove(path)
+    for i in range(num_files // step):
+        with open(os.path.join(root, f"new_{i}.txt"), "w") as f:
+            f.write("new")
+
+    start = time.time()
+    on_disk = scan_tree(root)
+    changed, removed, renamed, _ = diff_state(on_disk, stored, set(stored))
+    print(f"Reconcile scan+diff: {time.time() - start:.2f}s -> "
+          f"{len(changed)} to re-embed, {len(removed)} removed, {len(renamed)} moved")
@@ -0,0 +1,37 @@
+import sys
+import time
+import urllib.request
+import uuid
+
+# Usage: python bench_upload.py [num_files]  (server must be running on port 8001)
+BASE_URL = "http://localhost:8001"
+num_files = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+batch_size = 100
+
+def post_multipart(url, files):
+    boundary = uuid.uuid4().hex
+    body = b""
+    for name, content in files:
+        body += (f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; "
+                 f"filename=\"{name}\"\r\nContent-Type: text/plain\r\n\r\n").encode()
+        body += content + b"\r\n"
+    body += f"--{boundary}--\r\n".encode()
+    req = urllib.request.Request(url, data=body, method="POST",
+                                 headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    with urllib.request.urlopen(req) as resp:
+        return resp.read()
+
+run_id = uuid.uuid4().hex[:8]
+files = [(f"bench_{run_id}_{i}.txt", f"benchmark document {run_id} {i} about topic {i % 10}".encode())
+         for i in range(num_files)]
+
+start = time.time()
+for i in range(0, num_files, batch_size):
+    post_multipart(f"{BASE_URL}/upload/batch", files[i:i + batch_size])
+elapsed = time.time() - start
+print(f"Uploaded {num_files} files in {elapsed:.2f}s ({num_files / elapsed:.0f} files/s)")
+
+# Re-uploading the same content should be rejected without landing anything
+start = time.time()
+post_multipart(f"{BASE_URL}/upload/batch", files[:batch_size])
+print(f"Duplicate batch of {batch_size} rejected in {time.time() - start:.2f}s")
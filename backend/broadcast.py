@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+try:
+    import msgpack
+except ImportError: # Optional: clients fall back to JSON text frames
+    msgpack = None
+
+SEND_TIMEOUT = 10.0 # Seconds a single send may stall before the client is dropped
+
+class ClientChannel:
+    """
+    One connected dashboard. Sends run in the channel's own task, so a slow
+    client never delays the others. State snapshots are latest-wins: if the
+    client is still busy sending, a newer state replaces the pending one.
+    """
+    def __init__(self, hub, websocket, encoding):
+        self.hub = hub
+        self.websocket = websocket
+        self.encoding = encoding
+        self.pending_state = None
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def push_state(self, frame):
+        self.pending_state = frame
+        self.wakeup.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                if self.pending_state is not None:
+                    frame, self.pending_state = self.pending_state, None
+                    await self._send(frame)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Dropping WebSocket client: {e!r}")
+            self.hub.unregister(self.websocket)
+            # Close it too, so the client sees the drop and reconnects
+            try:
+                await asyncio.wait_for(self.websocket.close(code=1011), SEND_TIMEOUT)
+            except Exception:
+                pass
+
+    async def _send(self, frame):
+        if isinstance(frame, bytes):
+            await asyncio.wait_for(self.websocket.send_bytes(frame), SEND_TIMEOUT)
+        else:
+            await asyncio.wait_for(self.websocket.send_text(frame), SEND_TIMEOUT)
+
+class BroadcastHub:
+    """
+    Fan-out for dashboard updates. publish_state() encodes a payload once
+    per encoding in use and hands it to every channel without awaiting any
+    send, so callers (including run_coroutine_threadsafe broadcasts) never
+    block on a client and cannot interleave partial sends.
+    """
+    def __init__(self):
+        self.channels = {} # websocket -> ClientChannel
+
+    def register(self, websocket, encoding="json"):
+        if encoding == "msgpack" and msgpack is None:
+            encoding = "json"
+        channel = ClientChannel(self, websocket, encoding)
+        channel.task = asyncio.create_task(channel.run())
+        self.channels[websocket] = channel
+        return channel
+
+    def unregister(self, websocket):
+        channel = self.channels.pop(websocket, None)
+        if channel and channel.task and channel.task is not asyncio.current_task():
+            channel.task.cancel()
+
+    def publish_state(self, data):
+        channels = list(self.channels.values())
+        frames = self._encode({"type": "state", "data": data}, {c.encoding for c in channels})
+        for channel in channels:
+            channel.push_state(frames[channel.encoding])
+
+    def send_state(self, channel, data):
+        """Queues a state snapshot for one channel only, e.g. a client that just connected."""
+        frames = self._encode({"type": "state", "data": data}, {channel.encoding})
+        channel.push_state(frames[channel.encoding])
+
+    def _encode(self, message, encodings):
+        # Encode each payload once, not once per client
+        frames = {}
+        if "json" in encodings:
+            frames["json"] = json.dumps(message)
+        if "msgpack" in encodings:
+            frames["msgpack"] = msgpack.packb(message, use_bin_type=True)
+        return frames
+
+    def __len__(self):
+        return len(self.channels)
@@ -0,0 +1,139 @@
+import os
+import numpy as np
+
+GRAPH_MAX_CLUSTERS = 500 # Clusters (largest first) that get centroid similarity edges
+CLUSTER_NEIGHBORS = 3 # Similarity edges kept per cluster
+FILE_NEIGHBORS = 5 # kNN edges kept per file within an expanded page
+MAX_PAGE_SIZE = 500
+DEFAULT_KEYWORDS = ["document", "file", "data"]
+
+def format_size(size):
+    return f"{size / 1024 / 1024:.1f} MB" if size > 1024*1024 else f"{size / 1024:.1f} KB"
+
+def file_row(path, cluster, info, meta):
+    """
+    Dashboard fields for one file, read from the analyzer's cached info and
+    its stored (size, mtime_ns, inode) signature; no stat or text scan.
+    """
+    if meta:
+        size, modified_at = meta[0], meta[1] / 1e9
+    else:
+        size, modified_at = 0, 0
+    ext_str = os.path.splitext(path)[1]
+    return {
+        "path": path,
+        "name": os.path.basename(path),
+        "cluster": int(cluster),
+        "content": info["preview"] if info else "",
+        "size": format_size(size),
+        "modified": modified_at,
+        "type": ext_str.upper().replace('.', '') if ext_str else 'FILE',
+        "keywords": info["keywords"] if info else DEFAULT_KEYWORDS,
+        "confidence": info["confidence"] if info else 0.0,
+    }
+
+def cluster_centroids(embeddings, labels):
+    """Mean embedding and member count per label (labels are 0..k-1)."""
+    n_labels = int(labels.max()) + 1
+    counts = np.bincount(labels, minlength=n_labels)
+    centroids = np.zeros((n_labels, embeddings.shape[1]))
+    np.add.at(centroids, labels, embeddings)
+    centroids /= np.maximum(counts, 1)[:, None]
+    return centroids, counts
+
+def _normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _knn_edges(unit_vectors, ids, k):
+    """Top-k cosine neighbours for each row, as undirected (a, b, similarity) edges."""
+    m = len(ids)
+    if m < 2:
+        return []
+    k = min(k, m - 1)
+    sims = unit_vectors @ unit_vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    nearest = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    edges = {}
+    for i in range(m):
+        for j in nearest[i]:
+            a, b = (i, j) if i < j else (j, i)
+            edges[(a, b)] = float(sims[i, j])
+    return [{"source": ids[a], "target": ids[b], "similarity": round(s, 3)}
+            for (a, b), s in edges.items()]
+
+def build_cluster_graph(files, embeddings, labels, names, meta=None):
+    """
+    Cluster-level summary for the dashboard: member counts plus
+    centroid-similarity edges among the largest GRAPH_MAX_CLUSTERS clusters.
+    Labels can be any ints (e.g. folder ids with -1 for unsorted). Also keeps
+    per-cluster member indices, embedding rows and (size, mtime_ns, inode)
+    signatures, so file pages are served from this snapshot alone.
+    """
+    ids, dense = np.unique(labels, return_inverse=True)
+    centroids, counts = cluster_centroids(embeddings, dense)
+    by_size = np.argsort(-counts, kind='stable')
+
+    clusters = [{
+        "id": int(ids[c]),
+        "name": str(names.get(int(ids[c]), f"Topic_{ids[c]}")),
+        "count": int(counts[c]),
+    } for c in by_size]
+
+    # Clusters with no embedded members have no direction to compare
+    linked = [c for c in by_size[:GRAPH_MAX_CLUSTERS] if np.any(centroids[c])]
+    edges = _knn_edges(_normalize(centroids[linked]), [int(ids[c]) for c in linked], CLUSTER_NEIGHBORS)
+
+    order = np.argsort(dense, kind='stable')
+    bounds = np.searchsorted(dense[order], np.arange(len(ids)))
+    ends = np.append(bounds[1:], len(order))
+    members = {int(ids[c]): order[start:end] for c, (start, end) in enumerate(zip(bounds, ends))}
+
+    return {
+        "files": list(files),
+        "index": {f: i for i, f in enumerate(files)},
+        "clusters": clusters,
+        "edges": edges,
+        "members": members,
+        "embeddings": embeddings, # Rows align with files, so pages never look up the live dicts
+        "meta": meta if meta is not None else [None] * len(files),
+    }
+
+def cluster_summary(graph, offset=0, limit=GRAPH_MAX_CLUSTERS):
+    """One page of clusters (largest first) and the edges between them."""
+    page = graph["clusters"][offset:offset + limit]
+    ids = {c["id"] for c in page}
+    edges = [e for e in graph["edges"] if e["source"] in ids and e["target"] in ids]
+    return {
+        "total_clusters": len(graph["clusters"]),
+        "total_files": len(graph["files"]),
+        "offset": offset,
+        "clusters": page,
+        "edges": edges,
+    }
+
+def file_page(graph, cluster_id, file_info, offset=0, limit=100):
+    """
+    One page of a cluster's files (dashboard rows, see file_row) and a
+    sparse kNN graph among the page's embedded files. Work is O(limit^2)
+    regardless of cluster size. Raises KeyError for an unknown cluster.
+    """
+    members = graph["members"][cluster_id]
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    page = members[offset:offset + limit]
+    files = graph["files"]
+    paths = [files[i] for i in page]
+    nodes = [file_row(files[i], cluster_id, file_info.get(files[i]), graph["meta"][i]) for i in page]
+
+    edges = []
+    if paths:
+        rows = np.asarray(graph["embeddings"][page])
+        embedded = np.flatnonzero(np.any(rows, axis=1))
+        edges = _knn_edges(_normalize(rows[embedded]), [paths[i] for i in embedded], FILE_NEIGHBORS)
+
+    return {
+        "cluster": cluster_id,
+        "total": len(members),
+        "offset": offset,
+        "files": nodes,
+        "edges": edges,
+    }
@@ -1,27 +1,41 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, HTTPException, Request
 from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
-import shutil
 from watchdog.observers import Observer
 from monitor import FileMonitor
 from processor import extract_text
 from semantic import SemanticAnalyzer
-from organizer import organize_file
+from organizer import organize_file, organize_all, unique_target, OrganizeQueue
+from mover import move_engine
+from reconcile import reconcile
+from uploads import UploadManager
+from broadcast import BroadcastHub
+from graph import cluster_summary, file_page, GRAPH_MAX_CLUSTERS, MAX_PAGE_SIZE
+from typing import List, Optional
 import asyncio
+import math
 import os
-import json
 
 analyzer = SemanticAnalyzer()
 app = FastAPI()
 
 # Global Config
 watched_directory = os.path.abspath("../test_docs")
-connected_clients = []
+hub = BroadcastHub()
 
 # Ensure directory exists
 if not os.path.exists(watched_directory):
     os.makedirs(watched_directory)
 
+def schedule_broadcast():
+    """Thread-safe broadcast trigger for background workers."""
+    if loop and loop.is_running():
+        asyncio.run_coroutine_threadsafe(broadcast_update(), loop)
+
+# Watcher events and uploads both go through this queue, so each file is organized once
+organize_queue = OrganizeQueue(watched_directory, analyzer, on_idle=schedule_broadcast)
+upload_manager = UploadManager(watched_directory, analyzer, organize_queue)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -34,6 +48,11 @@ from pydantic import BaseModel
 
 class AnalysisRequest(BaseModel):
     algorithm: str
+    threshold: Optional[float] = None # Agglomerative distance threshold; re-cuts the stored tree
+
+def valid_threshold(threshold):
+    """A merge distance cut must be a positive, finite number."""
+    return math.isfinite(threshold) and threshold > 0
 
 def cleanup_empty_folders(root):
     """Recursively removes empty folders under the specified root."""
@@ -49,6 +68,8 @@ def cleanup_empty_folders(root):
 
 @app.post("/analyze")
 async def run_analysis(req: AnalysisRequest):
+    if req.threshold is not None and not valid_threshold(req.threshold):
+        raise HTTPException(status_code=400, detail="threshold must be a positive number")
     print(f"Triggering manual analysis with {req.algorithm}")
     # Update pipeline status for broadcast
     status = {
@@ -59,23 +80,8 @@ async def run_analysis(req: AnalysisRequest):
         "Clustering": "pending"
     }
     await broadcast_update(status)
-    
-    # Run organization on all files
-    print("Re-clustering...")
-    analyzer.recluster(algorithm=req.algorithm)
-    
-    # 2. Physically move files based on new labels
-    print("Applying physical reorganization...")
-    from organizer import organize_file
-    for file_path, label in list(analyzer.labels.items()):
-        if os.path.exists(file_path):
-            organize_file(file_path, watched_directory, analyzer)
-    
-    # 3. Final sync to ensure labels reflect the NEW paths
-    analyzer.sync_from_disk(watched_directory)
-    
-    # 4. Cleanup empty folders
-    cleanup_empty_folders(watched_directory)
+    # Clustering, moves and rescans all run off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, reorganize, req.algorithm, req.threshold)
     
     status["Preprocessing"] = "done"
     status["BERT Embeddings"] = "done"
@@ -85,6 +91,87 @@ async def run_analysis(req: AnalysisRequest):
     
     return {"status": "Analysis complete and filesystem reorganized"}
 
+def reorganize(algorithm, threshold):
+    # Held throughout so a concurrent broadcast's disk sync cannot replace
+    # the new labels before the files have been moved to match them
+    with analyzer.lock:
+        # 1. Relabel: re-cut the stored tree when only the threshold changes
+        if threshold is not None and algorithm != 'KMEANS' and analyzer.merge_tree is not None:
+            print(f"Re-cutting topic tree at {threshold}...")
+            analyzer.recut(threshold)
+        else:
+            if threshold is not None:
+                analyzer.threshold = threshold
+            print("Re-clustering...")
+            analyzer.recluster(algorithm=algorithm)
+        
+        # 2. Physically move files based on new labels, as one journaled batch
+        print("Applying physical reorganization...")
+        organize_all(watched_directory, analyzer)
+        
+        # 3. Final sync to ensure labels reflect the NEW paths
+        analyzer.sync_from_disk(watched_directory)
+    
+    # 4. Cleanup empty folders
+    cleanup_empty_folders(watched_directory)
+
+@app.get("/topics")
+async def get_topics(thresholds: Optional[str] = None):
+    """
+    Hierarchical topics cut from the stored merge tree, e.g.
+    /topics?thresholds=3.0,1.5,0.8 for three nested levels. Defaults to the
+    current threshold. Nothing is refit.
+    """
+    try:
+        levels = [float(t) for t in thresholds.split(",")] if thresholds else [analyzer.threshold]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="thresholds must be comma-separated numbers")
+    if not all(valid_threshold(t) for t in levels):
+        raise HTTPException(status_code=400, detail="thresholds must be positive numbers")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, analyzer.topic_tree, levels)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.get("/topics/dendrogram")
+async def get_dendrogram():
+    """Raw merge tree: node n+i merges children[i] at distances[i]."""
+    # The tree is replaced, never edited, so one read is a consistent snapshot
+    tree = analyzer.merge_tree
+    if tree is None:
+        raise HTTPException(status_code=409, detail="No merge tree available")
+    return {
+        "files": list(tree['files']),
+        "children": tree['children'].tolist(),
+        "distances": tree['distances'].tolist(),
+        "threshold": analyzer.threshold
+    }
+
+@app.get("/graph")
+async def get_graph(offset: int = 0, limit: int = 200):
+    """
+    Cluster-level graph over the folders on disk (ids match the WebSocket
+    state; -1 is unsorted root files): counts and centroid-similarity
+    edges, largest clusters first. File nodes come from /graph/clusters/{id}.
+    """
+    limit = max(1, min(limit, GRAPH_MAX_CLUSTERS))
+    graph = analyzer.cluster_graph # Immutable snapshot; no lock on the event loop
+    if graph is None:
+        return {"total_clusters": 0, "total_files": 0, "offset": 0, "clusters": [], "edges": []}
+    return cluster_summary(graph, offset, limit)
+
+@app.get("/graph/clusters/{cluster_id}")
+async def get_graph_cluster(cluster_id: int, offset: int = 0, limit: int = 100):
+    """One page of a cluster's files (size, type, preview, keywords, confidence) with kNN similarity edges."""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    graph = analyzer.cluster_graph
+    if graph is None:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+    try:
+        return file_page(graph, cluster_id, analyzer.file_info, offset, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Cluster not found")
+
 @app.get("/download")
 async def download_file(path: str):
     if not os.path.exists(path):
@@ -96,74 +183,97 @@ async def delete_file(path: str):
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File not found")
     try:
-        os.remove(path)
-        # Clear from analyzer
-        analyzer.labels.pop(path, None)
-        analyzer.file_contents.pop(path, None)
-        # Re-sync and broadcast
-        analyzer.sync_from_disk(watched_directory)
-        
-        # Cleanup parent folder if empty
-        cleanup_empty_folders(watched_directory)
-        
+        await asyncio.get_running_loop().run_in_executor(None, remove_and_sync, path)
         await broadcast_update()
         return {"status": "File deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def remove_and_sync(path):
+    os.remove(path)
+    # Clear from analyzer; the file is spliced out of the topic tree, no refit
+    analyzer.remove_file(os.path.abspath(path))
+    # Re-sync before the broadcast
+    analyzer.sync_from_disk(watched_directory)
+    
+    # Cleanup parent folder if empty
+    cleanup_empty_folders(watched_directory)
+
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    target_path = os.path.join(watched_directory, file.filename)
-    with open(target_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Trigger organization explicitly instead of relying on background monitor
-    print(f"Organizing uploaded file: {target_path}")
-    organize_file(target_path, watched_directory, analyzer)
-    
-    # Broadcast update to frontend
-    await broadcast_update()
-    
-    return {"filename": file.filename, "status": "uploaded and organized"}
+    # Streamed to staging and hashed while writing; duplicates never reach the root
+    result = await upload_manager.save(file)
+    if result["status"] == "error":
+        raise HTTPException(status_code=500, detail=f"Could not store {result['filename']}")
+    return result
+
+@app.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    results = [await upload_manager.save(f) for f in files]
+    return {"files": results}
+
+@app.post("/upload/session")
+async def upload_session_begin(filename: str):
+    session = await upload_manager.begin(filename)
+    return {"upload_id": session.upload_id, "received": 0}
+
+@app.get("/upload/session/{upload_id}")
+async def upload_session_status(upload_id: str):
+    try:
+        session = await upload_manager.get(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return {"upload_id": upload_id, "filename": session.filename, "received": session.received}
+
+@app.put("/upload/session/{upload_id}")
+async def upload_session_append(upload_id: str, request: Request, offset: int = 0):
+    """Appends the raw request body at offset. Resume from the 'received' value on 409."""
+    try:
+        received = await upload_manager.append(upload_id, offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"upload_id": upload_id, "received": received}
+
+@app.post("/upload/session/{upload_id}/complete")
+async def upload_session_complete(upload_id: str):
+    try:
+        result = await upload_manager.complete(upload_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if result["status"] == "error":
+        raise HTTPException(status_code=500, detail=f"Could not store {result['filename']}")
+    return result
 
 @app.get("/declutter")
 async def declutter_files():
     """Moves all files from subfolders back to root and resets semantic state."""
     print("Decluttering...")
-    
+    await asyncio.get_running_loop().run_in_executor(None, reset_to_root)
+    await broadcast_update()
+    return {"status": "decluttered"}
+
+def reset_to_root():
     # 1. Clear analyzer state
     analyzer.clear()
     
-    # 2. Move files back to root
-    for root, dirs, files in os.walk(watched_directory, topdown=False):
+    # 2. Move files back to root in a single journaled batch
+    moves = []
+    taken = set()
+    for root, dirs, files in os.walk(watched_directory):
         if root == watched_directory:
             continue
-            
         for name in files:
-            source = os.path.join(root, name)
-            dest = os.path.join(watched_directory, name)
-            
-            # Handle name collision
-            if os.path.exists(dest):
-                base, ext = os.path.splitext(name)
-                dest = os.path.join(watched_directory, f"{base}_reset{ext}")
-                
-            try:
-                shutil.move(source, dest)
-            except Exception as e:
-                print(f"Error moving {name}: {e}")
-                
-        # 3. Remove empty directories
-        for name in dirs:
-            dir_path = os.path.join(root, name)
-            try:
-                if not os.listdir(dir_path):
-                    os.rmdir(dir_path)
-            except:
-                pass
+            dest = unique_target(watched_directory, name, taken, suffix="reset")
+            taken.add(dest)
+            moves.append((os.path.join(root, name), dest))
+    move_engine.move_batch(moves)
 
-    await broadcast_update()
-    return {"status": "decluttered"}
+    # 3. Remove empty directories
+    cleanup_empty_folders(watched_directory)
 
 @app.get("/open")
 def open_file_api(path: str):
@@ -198,85 +308,63 @@ def handle_file_event(file_path, event_type):
         asyncio.run_coroutine_threadsafe(broadcast_update(), loop)
 
 async def broadcast_update(pipeline_status=None):
-    # Build current state of the semantic engine
     try:
-        # Sync with physical disk structure first
-        analyzer.sync_from_disk(watched_directory)
-        
-        # Default pipeline status if not provided
-        if not pipeline_status:
-            pipeline_status = {
-                "Load Documents": "done",
-                "Preprocessing": "done",
-                "BERT Embeddings": "done",
-                "Cosine Similarity": "done",
-                "Clustering": "done"
-            }
-
-        # Convert files to list of objects for frontend consistency
-        files_list = []
-        for path, label in analyzer.labels.items():
-            try:
-                stat = os.stat(path)
-                size = stat.st_size
-                modified_at = stat.st_mtime
-                ext_str = str(os.path.splitext(str(path))[1])
-                ext = ext_str.upper().replace('.', '') if ext_str else 'FILE'
-            except:
-                size = 0
-                modified_at = 0
-                ext = "UNKNOWN"
-
-            # Extract simple keywords from content as heuristic
-            content = analyzer.file_contents.get(path, "")
-            words = [w.lower() for w in content.split() if len(w) > 4][:3]
-            if not words: words = ["document", "file", "data"]
-
-            files_list.append({
-                "path": path,
-                "name": os.path.basename(path),
-                "cluster": int(label),
-                "content": content[:200] + "...",
-                "size": f"{size / 1024 / 1024:.1f} MB" if size > 1024*1024 else f"{size / 1024:.1f} KB",
-                "modified": modified_at,
-                "type": ext,
-                "keywords": words,
-                "confidence": 0.85 # Mock confidence score
-            })
-
-        data = {
-            "clusters": {str(k): str(v) for k, v in analyzer.cluster_names.items()},
-            "files": files_list,
-            "pipeline": pipeline_status,
-            "algorithm": "DBSCAN" # Placeholder for now
-        }
-        
-        message = json.dumps({"type": "state", "data": data})
-        
-        for client in list(connected_clients):
-            try:
-                await client.send_text(message)
-            except:
-                if client in connected_clients:
-                    connected_clients.remove(client)
+        # Disk rescan and row building take the analyzer lock; keep them off the loop
+        data = await asyncio.get_running_loop().run_in_executor(None, build_state, pipeline_status)
+        # Encoded once and handed to each client's sender task; a slow
+        # client only ever holds the newest state, never blocks the rest
+        hub.publish_state(data)
     except Exception as e:
         print(f"Broadcast error: {e}")
 
+def build_state(pipeline_status=None):
+    # Sync with physical disk structure first; rebuilds the cluster graph if it changed
+    analyzer.sync_from_disk(watched_directory)
+    
+    # Default pipeline status if not provided
+    if not pipeline_status:
+        pipeline_status = {
+            "Load Documents": "done",
+            "Preprocessing": "done",
+            "BERT Embeddings": "done",
+            "Cosine Similarity": "done",
+            "Clustering": "done"
+        }
+
+    # Cluster-level summary only, so the frame stays small however many
+    # files there are; the dashboard pages files in via /graph/clusters/{id}
+    graph = analyzer.cluster_graph
+    if graph is None:
+        summary = {"total_clusters": 0, "total_files": 0, "offset": 0, "clusters": [], "edges": []}
+    else:
+        summary = cluster_summary(graph, 0, GRAPH_MAX_CLUSTERS)
+    return {
+        **summary,
+        "pipeline": pipeline_status,
+        "algorithm": "DBSCAN" # Placeholder for now
+    }
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(websocket: WebSocket, encoding: str = "json"):
+    # encoding=msgpack gets binary state frames (if msgpack is installed)
     print("WebSocket connection attempting...")
     await websocket.accept()
     print("WebSocket connection accepted")
-    connected_clients.append(websocket)
-    # Send initial state
-    await broadcast_update()
+    channel = hub.register(websocket, encoding)
+    # Initial state goes to the new client only; the others are already current
+    try:
+        data = await asyncio.get_running_loop().run_in_executor(None, build_state)
+        hub.send_state(channel, data)
+    except Exception as e:
+        print(f"Initial state error: {e}")
     try:
         while True:
             data = await websocket.receive_text()
             print(f"Received: {data}")
     except WebSocketDisconnect:
         print("WebSocket disconnected")
-        connected_clients.remove(websocket)
+    finally:
+        hub.unregister(websocket)
 
 # Global state
 loop = None
@@ -290,15 +378,23 @@ async def startup_event():
     
     def handle_file_event(path, event_type):
         print(f"Background monitor: {event_type} event for {path}")
-        # 1. Organize the file physically
-        organize_file(path, watched_directory, analyzer)
-        # 2. Trigger UI update (thread-safe)
-        if loop:
-            asyncio.run_coroutine_threadsafe(broadcast_update(), loop)
+        # Organize via the shared queue; it broadcasts once the queue drains
+        organize_queue.submit(path)
+
+    # Finish any move batch a crash interrupted, so disk state is consistent
+    move_engine.recover()
+
+    # Pick up anything added, removed or edited while the server was down.
+    # Runs before the monitor starts so the two never process the same file.
+    print(f"Reconciling {watched_directory} with stored state...")
+    await loop.run_in_executor(None, reconcile, watched_directory, analyzer)
+    await loop.run_in_executor(None, analyzer.sync_from_disk, watched_directory)
+
+    organize_queue.start()
 
     # Start file monitoring
     print(f"Starting background monitor on {watched_directory}...")
-    monitor = FileMonitor(watched_directory, handle_file_event)
+    monitor = FileMonitor(watched_directory, handle_file_event, ignore=move_engine.is_own_event)
     monitor.start()
     
     print("SEFS Engine Online & Monitoring OS.")
@@ -309,4 +405,6 @@ def shutdown_event():
 
 if __name__ == "__main__":
     import uvicorn
+    # uvicorn already negotiates permessage-deflate by default (ws_per_message_deflate),
+    # which compresses the JSON state frames for clients that support it
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -4,12 +4,21 @@ from watchdog.events import FileSystemEventHandler
 import os
 
 class FileMonitorHandler(FileSystemEventHandler):
-    def __init__(self, callback):
+    def __init__(self, callback, ignore=None):
         self.callback = callback
+        # Optional predicate for events we caused ourselves (e.g. MoveEngine batches)
+        self.ignore = ignore
+
+    def _is_own(self, event):
+        return self.ignore is not None and self.ignore(
+            event.event_type, event.src_path, getattr(event, 'dest_path', None)
+        )
 
     def on_created(self, event):
         if event.is_directory:
             return
+        if self._is_own(event):
+            return
             
         # IGNORE events in subdirectories. We only want to organize files dropped in the ROOT
         # processed files are moved to subfolders, so we shouldn't touch them again
@@ -25,6 +34,8 @@ class FileMonitorHandler(FileSystemEventHandler):
     def on_modified(self, event):
         if event.is_directory:
             return
+        if self._is_own(event):
+            return
 
         if hasattr(self, 'root_dir') and os.path.dirname(event.src_path) != os.path.abspath(self.root_dir):
             return
@@ -33,19 +44,20 @@ class FileMonitorHandler(FileSystemEventHandler):
         self.callback(event.src_path, "modified")
 
     def on_moved(self, event):
-        if not event.is_directory:
+        if not event.is_directory and not self._is_own(event):
              if hasattr(self, 'root_dir') and os.path.dirname(event.dest_path) == os.path.abspath(self.root_dir):
                  print(f"File moved to root: {event.dest_path}")
                  self.callback(event.dest_path, "moved")
 
 class FileMonitor:
-    def __init__(self, path, callback):
+    def __init__(self, path, callback, ignore=None):
         self.path = path
         self.callback = callback
+        self.ignore = ignore
         self.observer = Observer()
 
     def start(self):
-        event_handler = FileMonitorHandler(self.callback)
+        event_handler = FileMonitorHandler(self.callback, self.ignore)
         event_handler.root_dir = self.path # Inject root dir for filtering
         self.observer.schedule(event_handler, self.path, recursive=True)
         self.observer.start()
@@ -0,0 +1,208 @@
+import errno
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from processor import get_file_hash
+
+MOVE_JOURNAL = 'moves.journal'
+SUPPRESS_TTL = 60.0 # Seconds an expected event that never arrived is kept after its batch
+TMP_SUFFIX = '.sefs-tmp'
+
+class MoveEngine:
+    """
+    Moves files in batches: the whole plan is written to an intent journal
+    before anything touches the disk, each move is a same-filesystem
+    os.rename (copy + replace only across devices), and the journal is
+    deleted once the batch is done. A crash midway is replayed by
+    recover() on the next startup.
+
+    Each move registers the exact watcher events it will cause (by type
+    and src -> dst pair). is_own_event() consumes them as they arrive, so
+    only the engine's own renames are ignored; a user touching the same
+    path afterwards is seen as usual.
+    """
+    def __init__(self, journal_path=MOVE_JOURNAL):
+        self.journal_path = journal_path
+        self._batch_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._expected = {} # (event_type, src, dst) -> (move group, terminal)
+        self._token_expiry = {} # token -> expiry time (None while in flight)
+
+    def is_own_event(self, event_type, src_path, dest_path=None):
+        """
+        True if this watcher event was caused by one of our moves. The event
+        that completes a move (the rename, or the create when the source is
+        outside the watched tree) clears all of that move's entries.
+        """
+        key = (event_type, os.path.abspath(src_path), os.path.abspath(dest_path) if dest_path else None)
+        with self._state_lock:
+            entry = self._expected.get(key)
+            if entry is None:
+                return False
+            group, terminal = entry
+            if terminal:
+                for k in group['keys']:
+                    self._expected.pop(k, None)
+            return True
+
+    def move_batch(self, moves):
+        """
+        Executes a list of (src, dst) moves. Destinations must not exist.
+        Returns the list of moves that completed.
+        """
+        moves = [(os.path.abspath(src), os.path.abspath(dst)) for src, dst in moves if src != dst]
+        # Never journal a move onto an existing file: recovery must be able to
+        # assume any destination it finds was written by this batch
+        for src, dst in moves:
+            if os.path.exists(dst):
+                print(f"Error moving {os.path.basename(src)}: {dst} already exists")
+        moves = [(src, dst) for src, dst in moves if not os.path.exists(dst)]
+        if not moves:
+            return []
+
+        with self._batch_lock:
+            token = uuid.uuid4().hex
+            self._begin(token, moves)
+            try:
+                self._write_journal(token, moves)
+                done = []
+                created_dirs = set()
+                for src, dst in moves:
+                    try:
+                        dst_dir = os.path.dirname(dst)
+                        if dst_dir not in created_dirs:
+                            os.makedirs(dst_dir, exist_ok=True)
+                            created_dirs.add(dst_dir)
+                        if os.path.exists(dst):
+                            raise FileExistsError(f"{dst} already exists")
+                        _move(src, dst)
+                        done.append((src, dst))
+                    except Exception as e:
+                        print(f"Error moving {os.path.basename(src)}: {e}")
+                        self._forget(token, src, dst)
+                os.remove(self.journal_path)
+            finally:
+                self._finish(token)
+            return done
+
+    def recover(self):
+        """Finishes an interrupted batch left behind by a crash."""
+        if not os.path.exists(self.journal_path):
+            return 0
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                journal = json.load(f)
+        except Exception as e:
+            print(f"Unreadable move journal, discarding: {e}")
+            os.remove(self.journal_path)
+            return 0
+
+        moves = [tuple(m) for m in journal.get('moves', [])]
+        print(f"Replaying interrupted move batch {journal.get('token')} ({len(moves)} moves)...")
+
+        with self._batch_lock:
+            token = journal.get('token') or uuid.uuid4().hex
+            self._begin(token, moves)
+            fixed = 0
+            try:
+                for src, dst in moves:
+                    try:
+                        fixed += _recover_move(src, dst)
+                    except Exception as e:
+                        print(f"Error recovering {os.path.basename(src)}: {e}")
+                os.remove(self.journal_path)
+            finally:
+                self._finish(token)
+        print(f"Move recovery complete: {fixed} files fixed up.")
+        return fixed
+
+    def _write_journal(self, token, moves):
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'token': token, 'created': time.time(), 'moves': moves}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def _begin(self, token, moves):
+        with self._state_lock:
+            now = time.time()
+            # Drop entries for events that never arrived (e.g. moves outside the watched tree)
+            expired = {t for t, exp in self._token_expiry.items() if exp is not None and exp <= now}
+            if expired:
+                self._expected = {k: e for k, e in self._expected.items() if e[0]['token'] not in expired}
+                for t in expired:
+                    del self._token_expiry[t]
+            self._token_expiry[token] = None
+            for src, dst in moves:
+                tmp = dst + TMP_SUFFIX
+                # (event, terminal): a terminal event lands the file at dst
+                events = [
+                    (('moved', src, dst), True), # same-device rename
+                    (('created', dst, None), True), # rename in from outside the watched tree
+                    (('created', tmp, None), False), # cross-device copy: temp file written...
+                    (('modified', tmp, None), False),
+                    (('moved', tmp, dst), True), # ...then swapped into place
+                ]
+                group = {'token': token, 'keys': [key for key, _ in events]}
+                for key, terminal in events:
+                    self._expected[key] = (group, terminal)
+
+    def _forget(self, token, src, dst):
+        # A move that failed causes no events; don't leave its entries armed
+        with self._state_lock:
+            entry = self._expected.get(('moved', src, dst))
+            if entry is not None and entry[0]['token'] == token:
+                for k in entry[0]['keys']:
+                    self._expected.pop(k, None)
+
+    def _finish(self, token):
+        # Watchdog delivers events asynchronously; entries stay until consumed or expired
+        with self._state_lock:
+            self._token_expiry[token] = time.time() + SUPPRESS_TTL
+
+def _move(src, dst):
+    try:
+        os.rename(src, dst)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Different filesystem: copy beside the target, then swap it in atomically
+        tmp = dst + TMP_SUFFIX
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+        os.remove(src)
+
+def _recover_move(src, dst):
+    """Brings one journaled move to its final state. Returns 1 if anything changed."""
+    tmp = dst + TMP_SUFFIX
+    if os.path.exists(tmp):
+        os.remove(tmp) # Cross-device copy that never completed
+    src_exists, dst_exists = os.path.exists(src), os.path.exists(dst)
+    if src_exists and dst_exists:
+        # A finished cross-device copy whose source was not removed yet is
+        # byte-identical. Anything else is not ours to delete.
+        if not _same_content(src, dst):
+            print(f"Move conflict: {src} and {dst} both exist and differ; leaving both.")
+            return 0
+        os.remove(src)
+        return 1
+    if src_exists:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _move(src, dst)
+        return 1
+    return 0
+
+def _same_content(a, b):
+    try:
+        if os.path.getsize(a) != os.path.getsize(b):
+            return False
+    except OSError:
+        return False
+    digest = get_file_hash(a)
+    return digest is not None and digest == get_file_hash(b)
+
+move_engine = MoveEngine()
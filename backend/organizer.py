@@ -1,6 +1,8 @@
 import os
-import shutil
-from processor import extract_text
+import queue
+import threading
+from processor import extract_text, get_file_hash
+from mover import move_engine
 # from semantic import SemanticAnalyzer
 
 # We will instantiate SemanticAnalyzer here or inject it
@@ -20,44 +22,49 @@ def organize_file(file_path, root_dir, analyzer):
     # But we want to avoid loops (moving file -> triggers modify -> moves again)
     
     try:
+        # Duplicate check first, against the hash index rather than by
+        # re-hashing the target folder; reuses the upload hash when known
+        src_hash = analyzer.cached_hash(file_path) or get_file_hash(file_path)
+        duplicate = analyzer.find_duplicate(src_hash, exclude=file_path) if src_hash else None
+        if duplicate:
+            print(f"Duplicate content found (matches {os.path.basename(duplicate)}). Removing {filename}.")
+            try:
+                os.remove(file_path)
+            except:
+                pass
+            analyzer.forget_hash(file_path)
+            return
+
         text = extract_text(file_path)
         if not text:
             print(f"No text extracted for {filename}. Skipping.")
             return
 
-        # Get embedding and update cluster
-        analyzer.update_file(file_path, text)
-        cluster_id = analyzer.get_cluster(file_path)
-        folder_name = analyzer.get_cluster_name(cluster_id)
+        # Get embedding and update cluster; the folder name comes from the
+        # same locked section, so a concurrent recluster cannot swap it
+        folder_name = analyzer.update_file(file_path, text)
+        if src_hash:
+            analyzer.record_hash(file_path, src_hash)
         
         target_dir = os.path.join(root_dir, folder_name)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-            
         target_path = os.path.join(target_dir, filename)
-        
-        # Don't move if already there
-        # Check for duplicates (filename collision OR content collision)
-        from processor import get_file_hash
-        src_hash = get_file_hash(file_path)
-        
-        # Check against ALL files in the target folder to find content duplicates
-        # even if filenames are different
-        if os.path.exists(target_dir):
-            for existing_file in os.listdir(target_dir):
-                existing_path = os.path.join(target_dir, existing_file)
-                if os.path.isfile(existing_path):
-                     dest_hash = get_file_hash(existing_path)
-                     if src_hash and dest_hash and src_hash == dest_hash:
-                         print(f"Duplicate content found (matches {existing_file}). Removing {filename}.")
-                         try:
-                            os.remove(file_path)
-                         except:
-                            pass
-                         return
+
+        # Until the startup backfill reaches it, the target folder may hold
+        # files the index has not seen; hash those (once) and check again
+        if src_hash and os.path.isdir(target_dir):
+            analyzer.ensure_hashes(os.path.join(target_dir, name) for name in os.listdir(target_dir))
+            duplicate = analyzer.find_duplicate(src_hash, exclude=file_path)
+            if duplicate:
+                print(f"Duplicate content found (matches {os.path.basename(duplicate)}). Removing {filename}.")
+                try:
+                    os.remove(file_path)
+                except:
+                    pass
+                analyzer.remove_file(file_path)
+                return
 
         if os.path.exists(target_path):
-             # Filename collision but DIFFERENT content (checked above)
+             # Filename collision but different content (checked above)
              # Rename source
              base, ext = os.path.splitext(filename)
              import time
@@ -66,7 +73,85 @@ def organize_file(file_path, root_dir, analyzer):
              print(f"Filename collision, renaming to {new_filename}")
 
         print(f"Moving {filename} to {folder_name}")
-        shutil.move(file_path, target_path)
+        for src, dst in move_engine.move_batch([(file_path, target_path)]):
+            # Keep stored state keyed by the new location so restarts don't re-embed it
+            analyzer.rename_file(src, dst)
         
     except Exception as e:
         print(f"Error organizing {filename}: {e}")
+
+def unique_target(target_dir, filename, taken, suffix="dup"):
+    """Returns a path in target_dir for filename that exists neither on disk nor in taken."""
+    target_path = os.path.abspath(os.path.join(target_dir, filename))
+    base, ext = os.path.splitext(filename)
+    n = 1
+    while target_path in taken or os.path.exists(target_path):
+        target_path = os.path.abspath(os.path.join(target_dir, f"{base}_{suffix}{n}{ext}"))
+        n += 1
+    return target_path
+
+def organize_all(root_dir, analyzer, paths=None):
+    """
+    Moves every embedded file (or only those in paths) into the folder of
+    its current cluster as a single journaled batch. Nothing is re-read or
+    re-embedded.
+    """
+    root_dir = os.path.abspath(root_dir)
+    moves = []
+    taken = set()
+    if paths is None:
+        labelled = list(analyzer.labels.items())
+    else:
+        labelled = [(p, analyzer.labels[p]) for p in paths if p in analyzer.labels]
+    for file_path, cluster_id in labelled:
+        if not os.path.exists(file_path):
+            continue
+        target_dir = os.path.join(root_dir, analyzer.get_cluster_name(cluster_id))
+        if os.path.dirname(os.path.abspath(file_path)) == target_dir:
+            continue
+        target_path = unique_target(target_dir, os.path.basename(file_path), taken)
+        taken.add(target_path)
+        moves.append((file_path, target_path))
+
+    print(f"Moving {len(moves)} files in one batch...")
+    done = move_engine.move_batch(moves)
+    analyzer.rename_files(dict(done))
+    return done
+
+class OrganizeQueue:
+    """
+    Single background worker that runs organize_file. A path that is already
+    waiting is not queued again, so the watcher and the upload endpoints can
+    both submit the same file without it being processed twice.
+    """
+    def __init__(self, root_dir, analyzer, on_idle=None):
+        self.root_dir = root_dir
+        self.analyzer = analyzer
+        self.on_idle = on_idle # Called once the queue drains (e.g. to broadcast)
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, file_path):
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            if file_path in self._pending:
+                return False
+            self._pending.add(file_path)
+        self._queue.put(file_path)
+        return True
+
+    def _run(self):
+        while True:
+            file_path = self._queue.get()
+            with self._lock:
+                self._pending.discard(file_path)
+            if os.path.exists(file_path):
+                organize_file(file_path, self.root_dir, self.analyzer)
+            if self._queue.empty() and self.on_idle:
+                self.on_idle()
@@ -1,6 +1,8 @@
 import os
 import pypdf
 
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf')
+
 def extract_text(file_path):
     _, ext = os.path.splitext(file_path)
     ext = ext.lower()
@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from processor import extract_text, get_file_hash, SUPPORTED_EXTENSIONS
+from organizer import organize_all
+
+SCAN_WORKERS = 8
+
+def _scan_dir(dir_path):
+    """Lists one directory. Returns ({path: (size, mtime_ns, inode)}, [subdirs])."""
+    files = {}
+    subdirs = []
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                # Skip hidden/system entries (e.g. .sefs journals, .DS_Store)
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    if os.path.splitext(entry.name)[1].lower() not in SUPPORTED_EXTENSIONS:
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    files[os.path.abspath(entry.path)] = (st.st_size, st.st_mtime_ns, entry.inode())
+    except OSError as e:
+        print(f"Scan error in {dir_path}: {e}")
+    return files, subdirs
+
+def scan_tree(root_dir, max_workers=SCAN_WORKERS):
+    """
+    Walks root_dir with os.scandir, one directory per task across a thread pool.
+    Only stats entries; file contents are never read.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(_scan_dir, root_dir)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                results.update(files)
+                for sub in subdirs:
+                    pending.add(pool.submit(_scan_dir, sub))
+    return results
+
+def diff_state(on_disk, stored_meta, stored_paths):
+    """
+    Compares the scanned tree against the analyzer's stored signatures.
+
+    Returns (changed, removed, renamed, adopted):
+      changed -- paths that are new or whose (size, mtime, inode) differ
+      removed -- stored paths no longer on disk
+      renamed -- {old_path: new_path} for files that only moved (same signature)
+      adopted -- {path: signature} for stored files that had no signature yet
+    """
+    changed = []
+    adopted = {}
+    for path, sig in on_disk.items():
+        if path not in stored_paths:
+            changed.append(path)
+            continue
+        old_sig = stored_meta.get(path)
+        if old_sig is None:
+            # State from before signatures were stored: trust it, just record the stat
+            adopted[path] = sig
+        elif tuple(old_sig) != sig:
+            changed.append(path)
+
+    missing = [p for p in stored_paths if p not in on_disk]
+
+    # Match missing entries to "new" paths by signature: a move on the same
+    # filesystem keeps inode, size and mtime, so there is nothing to re-embed.
+    by_sig = {}
+    for path in missing:
+        sig = stored_meta.get(path)
+        if sig is not None and sig[2]:
+            by_sig[tuple(sig)] = path
+
+    renamed = {}
+    still_changed = []
+    for path in changed:
+        old_path = None if path in stored_paths else by_sig.pop(on_disk[path], None)
+        if old_path:
+            renamed[old_path] = path
+        else:
+            still_changed.append(path)
+
+    removed = [p for p in missing if p not in renamed]
+    return still_changed, removed, renamed, adopted
+
+def reconcile(root_dir, analyzer):
+    """
+    Brings the analyzer in line with what is on disk after downtime.
+    Unchanged files are never re-read; only new/modified files are extracted
+    and embedded, and clustering runs once at the end. Files dropped in the
+    root meanwhile are embedded in the same pass and moved as one batch.
+    """
+    start = time.time()
+    on_disk = scan_tree(root_dir)
+    scan_time = time.time() - start
+
+    changed, removed, renamed, adopted = diff_state(
+        on_disk, analyzer.file_meta, set(analyzer.file_embeddings.keys())
+    )
+    print(f"Reconcile scan: {len(on_disk)} files in {scan_time:.2f}s "
+          f"({len(changed)} changed, {len(removed)} removed, {len(renamed)} moved)")
+
+    analyzer.file_meta.update(adopted)
+    analyzer.rename_files(renamed, save=False)
+    for path in removed:
+        analyzer.remove_file(path, recluster=False)
+
+    root = os.path.abspath(root_dir)
+    dropped_in_root = []
+    for path in changed:
+        in_root = os.path.dirname(path) == root
+        digest = None
+        if in_root:
+            # Same duplicate check the watcher's organize_file would have done
+            digest = get_file_hash(path)
+            duplicate = analyzer.find_duplicate(digest, exclude=path) if digest else None
+            if duplicate:
+                print(f"Duplicate content found (matches {os.path.basename(duplicate)}). Removing {os.path.basename(path)}.")
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+        text = extract_text(path)
+        if text:
+            analyzer.update_file(path, text, recluster=False)
+            if in_root:
+                if digest:
+                    analyzer.record_hash(path, digest)
+                dropped_in_root.append(path)
+        else:
+            analyzer.remove_file(path, recluster=False)
+
+    if changed and analyzer.file_embeddings:
+        analyzer.recluster()
+    elif (removed or renamed) and analyzer.merge_tree is not None:
+        # Removals and moves are spliced into the stored tree; no refit needed
+        analyzer.recut(analyzer.threshold)
+    elif removed or renamed or adopted:
+        analyzer.recluster()
+    # recluster only persists when there is something to cluster
+    analyzer.save_state()
+
+    if dropped_in_root:
+        # Labels are fresh from the single recluster above; one journaled batch
+        organize_all(root_dir, analyzer, paths=dropped_in_root)
+
+    # Index content hashes for duplicate detection in the background; only
+    # files without a valid stored hash are read, so later starts are quick
+    threading.Thread(target=backfill_hashes, args=(sorted(on_disk), analyzer), daemon=True).start()
+
+    print(f"Reconcile complete in {time.time() - start:.2f}s.")
+    return {"scanned": len(on_disk), "changed": len(changed),
+            "removed": len(removed), "moved": len(renamed)}
+
+def backfill_hashes(paths, analyzer):
+    """Hashes every file the duplicate index does not cover yet, then persists it."""
+    start = time.time()
+    hashed = analyzer.ensure_hashes(paths)
+    if hashed:
+        analyzer.save_state()
+    print(f"Hash index: {hashed} files hashed in {time.time() - start:.2f}s.")
@@ -1,29 +1,85 @@
 from sentence_transformers import SentenceTransformer
 from sklearn.cluster import AgglomerativeClustering
 from sklearn.feature_extraction.text import TfidfVectorizer
+from topics import cut_tree, remove_leaf, nest_cuts
+from processor import get_file_hash
+from graph import cluster_centroids, build_cluster_graph, DEFAULT_KEYWORDS
+from scipy import sparse
 import numpy as np
+import functools
 import os
 import pickle
+import threading
 
 # Constants
 MODEL_NAME = 'all-MiniLM-L6-v2'
 CLUSTER_FILE = 'clusters.pkl'
 SIMILARITY_THRESHOLD = 1.5 # Distance threshold for Agglomerative (Ward linkage)
+KEYWORDS_PER_FILE = 3
+PREVIEW_CHARS = 200
+TERM_MAX_FEATURES = 50000 # Vocabulary cap for the cached corpus term matrix
+TERM_MIN_DF = 2 # Terms must appear in this many files (once the corpus is larger than this)
+
+def file_signature(file_path):
+    """Returns (size, mtime_ns, inode) for change detection, or None if unreadable."""
+    try:
+        st = os.stat(file_path)
+        return (st.st_size, st.st_mtime_ns, st.st_ino)
+    except OSError:
+        return None
+
+def synchronized(method):
+    """Runs the method under the analyzer's lock (watcher, organize worker and API share it)."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def hash_synchronized(method):
+    """Guards the hash index with its own lock, so upload duplicate checks never wait on a recluster."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.hash_lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class SemanticAnalyzer:
     def __init__(self):
+        self.lock = threading.RLock()
+        self.hash_lock = threading.RLock()
         print(f"Loading model {MODEL_NAME}...")
         self.model = SentenceTransformer(MODEL_NAME)
         self.file_embeddings = {} # path -> embedding
         self.file_contents = {} # path -> text content (stored for keywords)
+        self.file_meta = {} # path -> (size, mtime_ns, inode) at time of embedding
+        self.file_info = {} # path -> cached dashboard fields (keywords, confidence, preview)
+        self.file_hashes = {} # path -> (signature, sha256) for duplicate detection
+        self.hash_paths = {} # sha256 -> {paths}
         self.clustering_model = None
+        self.merge_tree = None # {'files', 'children', 'distances'} from the last agglomerative fit
+        self.cluster_graph = None # Dashboard graph over the folders on disk, rebuilt by sync_from_disk
+        self.graph_source = None # (labels, version) the current cluster_graph was built from
+        self.version = 0 # Bumped whenever stored files or their cached info change
+        self.term_cache = None # (files, tfidf matrix, terms) shared by names and keywords
+        self.threshold = SIMILARITY_THRESHOLD
         self.labels = {}
         self.cluster_names = {}
         self.load_state()
 
+    @synchronized
     def clear(self):
         self.file_embeddings = {}
         self.file_contents = {}
+        self.file_meta = {}
+        self.file_info = {}
+        self.merge_tree = None
+        self.cluster_graph = None
+        self.term_cache = None
+        self.version += 1
+        with self.hash_lock:
+            self.file_hashes = {}
+            self.hash_paths = {}
         self.labels = {}
         self.cluster_names = {}
         if os.path.exists(CLUSTER_FILE):
@@ -35,22 +91,137 @@ class SemanticAnalyzer:
             return np.zeros(384)
         return self.model.encode(text)
 
-    def update_file(self, file_path, text):
+    def update_file(self, file_path, text, recluster=True):
+        """Embeds a file and returns the folder name of its cluster, read under the same lock."""
         embedding = self.get_embedding(text)
-        self.file_embeddings[file_path] = embedding
-        self.file_contents[file_path] = text
-        self.recluster()
+        with self.lock:
+            self.file_embeddings[file_path] = embedding
+            self.file_contents[file_path] = text
+            self.file_meta[file_path] = file_signature(file_path)
+            self.term_cache = None
+            self.version += 1
+            if recluster:
+                self.recluster()
+            return self.get_cluster_name(self.get_cluster(file_path))
 
-    def remove_file(self, file_path):
+    @synchronized
+    def remove_file(self, file_path, recluster=True):
         self.file_embeddings.pop(file_path, None)
         self.file_contents.pop(file_path, None)
-        self.recluster()
-            
+        self.file_meta.pop(file_path, None)
+        self.file_info.pop(file_path, None)
+        self.forget_hash(file_path)
+        self._drop_from_tree(file_path)
+        self.version += 1
+        if recluster:
+            if self.merge_tree is not None:
+                # Removing a leaf never needs a refit: splice it out and re-cut
+                self.recut(self.threshold)
+            else:
+                self.recluster()
+
+    @hash_synchronized
+    def record_hash(self, file_path, digest):
+        """Remembers a file's content hash, valid while its signature is unchanged."""
+        self.forget_hash(file_path)
+        self.file_hashes[file_path] = (file_signature(file_path), digest)
+        self.hash_paths.setdefault(digest, set()).add(file_path)
+
+    @hash_synchronized
+    def forget_hash(self, file_path):
+        entry = self.file_hashes.pop(file_path, None)
+        if entry:
+            paths = self.hash_paths.get(entry[1], set())
+            paths.discard(file_path)
+            if not paths:
+                self.hash_paths.pop(entry[1], None)
+
+    @hash_synchronized
+    def cached_hash(self, file_path):
+        """Returns the stored hash if the file has not changed since it was recorded."""
+        entry = self.file_hashes.get(file_path)
+        if entry and entry[0] is not None and entry[0] == file_signature(file_path):
+            return entry[1]
+        return None
+
+    @hash_synchronized
+    def find_duplicate(self, digest, exclude=None):
+        """
+        Returns the path of another file on disk with this content hash, if
+        any. Entries whose file changed or vanished since hashing are dropped.
+        """
+        for path in list(self.hash_paths.get(digest, ())):
+            if path == exclude:
+                continue
+            if self.cached_hash(path) == digest:
+                return path
+            self.forget_hash(path)
+        return None
+
+    def ensure_hashes(self, paths):
+        """
+        Hashes and records every path without a valid cached hash. Files are
+        read outside the hash lock, so duplicate checks never wait on this.
+        Returns the number of files hashed.
+        """
+        hashed = 0
+        for path in paths:
+            if not os.path.isfile(path) or self.cached_hash(path):
+                continue
+            before = file_signature(path)
+            digest = get_file_hash(path) if before else None
+            if digest is None:
+                continue
+            with self.hash_lock:
+                # Skip files that changed (or moved) while being read
+                if file_signature(path) == before:
+                    self.record_hash(path, digest)
+                    hashed += 1
+        return hashed
+
+    def rename_file(self, old_path, new_path, save=True):
+        """Re-keys a file's stored state after a move, without re-embedding."""
+        self.rename_files({old_path: new_path}, save=save)
+
+    @synchronized
+    def rename_files(self, renames, save=True):
+        """
+        Re-keys stored state for a batch of moves ({old_path: new_path}).
+        The merge tree and dashboard graph are replaced rather than edited,
+        so readers holding the previous snapshot never see a partial rename.
+        """
+        with self.hash_lock:
+            for old_path, new_path in renames.items():
+                entry = self.file_hashes.get(old_path)
+                if entry:
+                    self.record_hash(new_path, entry[1])
+                    self.forget_hash(old_path)
+        for old_path, new_path in renames.items():
+            if old_path not in self.file_embeddings:
+                continue
+            self.file_embeddings[new_path] = self.file_embeddings.pop(old_path)
+            self.file_contents[new_path] = self.file_contents.pop(old_path, "")
+            self.file_meta.pop(old_path, None)
+            self.file_meta[new_path] = file_signature(new_path)
+            if old_path in self.file_info:
+                self.file_info[new_path] = self.file_info.pop(old_path)
+            if old_path in self.labels:
+                self.labels[new_path] = self.labels.pop(old_path)
+        self.cluster_graph = _renamed(self.cluster_graph, renames)
+        self.merge_tree = _renamed(self.merge_tree, renames)
+        self.version += 1
+        if save:
+            self.save_state()
+
+    @synchronized
     def recluster(self, algorithm='DBSCAN'):
+        self.merge_tree = None
         if not self.file_embeddings:
              self.clustering_model = None
              self.labels = {}
              self.cluster_names = {}
+             self.file_info = {}
+             self.version += 1
              return
 
         embeddings = list(self.file_embeddings.values())
@@ -58,7 +229,7 @@ class SemanticAnalyzer:
         
         if len(files) < 2:
             self.labels = {f: 0 for f in files}
-            self.generate_names()
+            self.refresh_caches(files, np.asarray(embeddings), np.zeros(len(files), dtype=int))
             return
 
         if algorithm == 'KMEANS':
@@ -72,50 +243,185 @@ class SemanticAnalyzer:
             # Agglomerative Clustering (DBSCAN alternative in this context)
             self.clustering_model = AgglomerativeClustering(
                 n_clusters=None, 
-                distance_threshold=SIMILARITY_THRESHOLD,
+                distance_threshold=self.threshold,
                 compute_full_tree=True
             )
         
         self.clustering_model.fit(embeddings)
+        if algorithm != 'KMEANS':
+            # Keep the full merge tree so other thresholds are a re-cut, not a refit
+            self._set_tree(files, self.clustering_model.children_, self.clustering_model.distances_)
         self.labels = {files[i]: int(self.clustering_model.labels_[i]) for i in range(len(files))}
-        self.generate_names()
+        self.refresh_caches(files, np.asarray(embeddings), np.asarray(self.clustering_model.labels_))
         self.save_state()
 
-    def generate_names(self):
-        """Generates names for each cluster using TF-IDF keywords."""
-        cluster_docs = {}
-        unique_labels = set(self.labels.values())
-        
-        for file_path, label in self.labels.items():
-            if label not in cluster_docs:
-                cluster_docs[label] = []
-            if file_path in self.file_contents:
-                cluster_docs[label].append(self.file_contents[file_path])
-        
-        self.cluster_names = {}
-        for label, docs in cluster_docs.items():
-            combined_text = " ".join(docs)
-            if not combined_text.strip():
-                self.cluster_names[label] = f"Misc_{label}"
-                continue
-                
-            try:
-                # TF-IDF for top keywords (unigrams and bigrams)
-                vectorizer = TfidfVectorizer(stop_words='english', max_features=3, ngram_range=(1,2))
-                vectorizer.fit([combined_text])
-                # Get feature names and their scores to pick best
-                feature_names = vectorizer.get_feature_names_out()
-                
-                # Simple heuristic: join top 2 keywords if available
-                if len(feature_names) > 0:
-                    # Capitalize each word
-                    name = "_".join([w.title() for w in feature_names[:2]])
-                    self.cluster_names[label] = name
-                else:
-                    self.cluster_names[label] = f"Topic_{label}"
-            except Exception as e:
-                 print(f"Naming error: {e}")
-                 self.cluster_names[label] = f"Topic_{label}"
+    @synchronized
+    def recut(self, threshold):
+        """
+        Re-labels files by cutting the stored merge tree at a new distance
+        threshold. O(n) over the tree; the embeddings are not refit.
+        Raises ValueError if there is no tree (e.g. after a KMEANS run).
+        """
+        if self.merge_tree is None:
+            raise ValueError("No merge tree available; run agglomerative clustering first")
+        self.threshold = threshold
+        files = self.merge_tree['files']
+        labels = cut_tree(self.merge_tree['children'], self.merge_tree['distances'], threshold)
+        self.labels = {files[i]: int(labels[i]) for i in range(len(files))}
+        embeddings = np.asarray([self.file_embeddings[f] for f in files])
+        self.refresh_caches(files, embeddings, labels)
+        self.save_state()
+
+    @synchronized
+    def topic_tree(self, thresholds):
+        """
+        Nested topics from the stored merge tree, one level per threshold
+        (coarsest first). Each node has a name from its members' cached
+        keywords, a file count and its children; leaf levels list files.
+        """
+        if self.merge_tree is None:
+            raise ValueError("No merge tree available; run agglomerative clustering first")
+        files = self.merge_tree['files']
+        thresholds, levels, parents = nest_cuts(
+            self.merge_tree['children'], self.merge_tree['distances'], thresholds
+        )
+
+        nodes = []
+        for depth, labels in enumerate(levels):
+            members = {}
+            for i, label in enumerate(labels):
+                members.setdefault(int(label), []).append(files[i])
+            level_nodes = {}
+            for label, paths in members.items():
+                level_nodes[label] = {
+                    "id": f"{depth}-{label}",
+                    "name": self._topic_name(paths, label),
+                    "count": len(paths),
+                    "children": [],
+                }
+                if depth == len(levels) - 1:
+                    level_nodes[label]["files"] = paths
+            if depth > 0:
+                for label, node in level_nodes.items():
+                    nodes[depth - 1][parents[depth][label]]["children"].append(node)
+            nodes.append(level_nodes)
+
+        roots = list(nodes[0].values()) if nodes else []
+        return {"thresholds": thresholds, "topics": roots}
+
+    def _topic_name(self, paths, label):
+        # Cheap name from the cached per-file keywords instead of a fresh TF-IDF fit
+        counts = {}
+        for path in paths:
+            for word in self.file_info.get(path, {}).get("keywords", []):
+                if word not in DEFAULT_KEYWORDS:
+                    counts[word] = counts.get(word, 0) + 1
+        top = sorted(counts, key=counts.get, reverse=True)[:2]
+        return "_".join(w.title() for w in top) if top else f"Topic_{label}"
+
+    def _set_tree(self, files, children, distances):
+        self.merge_tree = {
+            'files': list(files),
+            'index': {f: i for i, f in enumerate(files)},
+            'children': np.asarray(children),
+            'distances': np.asarray(distances),
+        }
+
+    def _drop_from_tree(self, file_path):
+        if self.merge_tree is None:
+            return
+        index = self.merge_tree['index'].get(file_path)
+        if index is None:
+            return
+        files = self.merge_tree['files']
+        if len(files) <= 2:
+            # Too small to keep a tree; the next recluster handles it
+            self.merge_tree = None
+            return
+        children, distances = remove_leaf(self.merge_tree['children'], self.merge_tree['distances'], index)
+        self._set_tree(files[:index] + files[index + 1:], children, distances)
+
+    def refresh_caches(self, files, embeddings, labels):
+        """Rebuilds everything derived from a fresh labelling (names, file info)."""
+        X, terms = self.term_matrix(files)
+        self.generate_names(labels, X, terms)
+        self.compute_file_info(files, embeddings, labels, X, terms)
+        self.version += 1
+
+    def term_matrix(self, files):
+        """
+        Corpus TF-IDF matrix (unigrams and bigrams) with one row per file.
+        Fit once per corpus and shared by cluster names and file keywords,
+        so a re-cut over unchanged files does no text work at all.
+        Returns (None, None) when there is no usable text.
+        """
+        key = tuple(files)
+        if self.term_cache is not None and self.term_cache[0] == key:
+            return self.term_cache[1], self.term_cache[2]
+        texts = [self.file_contents.get(f, "") for f in files]
+        try:
+            # Bounded so the cached matrix scales with file count, not total text
+            vectorizer = TfidfVectorizer(
+                stop_words='english', ngram_range=(1, 2), dtype=np.float32,
+                max_features=TERM_MAX_FEATURES,
+                min_df=TERM_MIN_DF if len(files) > TERM_MIN_DF else 1,
+            )
+            X = vectorizer.fit_transform(texts).tocsr()
+            terms = vectorizer.get_feature_names_out()
+        except ValueError:
+            # Empty vocabulary (no usable text, or nothing shared by enough files)
+            X, terms = None, None
+        self.term_cache = (key, X, terms)
+        return X, terms
+
+    def compute_file_info(self, files, embeddings, labels, X, terms):
+        """
+        Precomputes per-file keywords and confidence in one pass over the
+        embedding matrix and corpus term matrix, so broadcasts only read cache.
+        Confidence is the cosine similarity between a file and its cluster centroid.
+        """
+        centroids, _ = cluster_centroids(embeddings, labels)
+        assigned = centroids[labels]
+        norms = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(assigned, axis=1)
+        similarity = np.einsum('ij,ij->i', embeddings, assigned) / np.maximum(norms, 1e-12)
+        confidence = np.clip(similarity, 0.0, 1.0)
+
+        if X is not None:
+            keywords = _top_terms(X, terms, KEYWORDS_PER_FILE)
+        else:
+            keywords = [[] for _ in files]
+
+        file_info = {}
+        for i, path in enumerate(files):
+            file_info[path] = {
+                "keywords": keywords[i] or DEFAULT_KEYWORDS,
+                "confidence": round(float(confidence[i]), 3),
+                "preview": self.file_contents.get(path, "")[:PREVIEW_CHARS] + "...",
+            }
+        # Swapped in whole so lock-free readers never see it half-built
+        self.file_info = file_info
+
+    def generate_names(self, labels, X, terms):
+        """
+        Names each cluster after its two strongest TF-IDF terms. The cluster's
+        rows of the shared term matrix are summed with one sparse product
+        instead of fitting a vectorizer per cluster.
+        """
+        n_labels = int(labels.max()) + 1
+        self.cluster_names = {int(label): f"Misc_{label}" for label in np.unique(labels)}
+        if X is None:
+            return
+        indicator = sparse.csr_matrix(
+            (np.ones(len(labels)), (labels, np.arange(len(labels)))), shape=(n_labels, len(labels))
+        )
+        for label, top in enumerate(_top_terms((indicator @ X).tocsr(), terms, 4)):
+            picked = []
+            for term in top:
+                # Skip a bigram's own unigrams (and vice versa) so names don't repeat words
+                if not any(set(term.split()) & set(p.split()) for p in picked):
+                    picked.append(term)
+            if picked:
+                self.cluster_names[label] = "_".join(w.title() for w in picked[:2])
 
     def get_cluster(self, file_path):
         return self.labels.get(file_path, -1)
@@ -124,11 +430,18 @@ class SemanticAnalyzer:
         if cluster_id == -1: return "Unsorted"
         return self.cluster_names.get(cluster_id, f"Topic_{cluster_id}")
 
+    @synchronized
     def save_state(self):
+        with self.hash_lock:
+            file_hashes = dict(self.file_hashes)
         with open(CLUSTER_FILE, 'wb') as f:
             pickle.dump({
                 'embeddings': self.file_embeddings,
-                'contents': self.file_contents # Persist content for naming
+                'contents': self.file_contents, # Persist content for naming
+                'meta': self.file_meta, # Persist signatures for startup reconciliation
+                'hashes': file_hashes,
+                'tree': self.merge_tree, # Agglomerative merge tree for re-cuts
+                'threshold': self.threshold
             }, f)
 
     def load_state(self):
@@ -138,15 +451,30 @@ class SemanticAnalyzer:
                     data = pickle.load(f)
                     self.file_embeddings = data.get('embeddings', {})
                     self.file_contents = data.get('contents', {})
-                    # Re-run clustering to restore state
-                    self.recluster() 
+                    self.file_meta = data.get('meta', {})
+                    self.file_hashes = data.get('hashes', {})
+                    self.hash_paths = {}
+                    for p, (_, h) in self.file_hashes.items():
+                        self.hash_paths.setdefault(h, set()).add(p)
+                    self.threshold = data.get('threshold', SIMILARITY_THRESHOLD)
+                    tree = data.get('tree')
+                    if tree is not None and set(tree['files']) == set(self.file_embeddings):
+                        # Same files as the stored tree: cut it instead of refitting
+                        self.merge_tree = tree
+                        self.recut(self.threshold)
+                    else:
+                        # Re-run clustering to restore state
+                        self.recluster() 
             except:
                 print("Failed to load cluster state.")
 
+    @synchronized
     def sync_from_disk(self, root_dir):
         """
         Scans the disk and updates labels/names based on physical folder structure.
-        Ensures the UI reflects ACTUAL disk state.
+        Ensures the UI reflects ACTUAL disk state. Folder ids follow sorted
+        folder names (root files are -1), and the dashboard graph is built
+        on the same ids, only when the layout or the stored files changed.
         """
         new_labels = {}
         new_cluster_names = {}
@@ -156,7 +484,7 @@ class SemanticAnalyzer:
         if not os.path.exists(root_dir):
             return
 
-        for item in os.listdir(root_dir):
+        for item in sorted(os.listdir(root_dir)):
             item_path = os.path.abspath(os.path.join(root_dir, item))
             if os.path.isdir(item_path):
                 cluster_id = next_id
@@ -165,7 +493,7 @@ class SemanticAnalyzer:
                 next_id += 1
                 
                 # Scan subfiles
-                for sub_item in os.listdir(item_path):
+                for sub_item in sorted(os.listdir(item_path)):
                     sub_path = os.path.abspath(os.path.join(item_path, sub_item))
                     if os.path.isfile(sub_path):
                         new_labels[sub_path] = cluster_id
@@ -175,4 +503,42 @@ class SemanticAnalyzer:
 
         self.labels = new_labels
         self.cluster_names = new_cluster_names
+        if self.graph_source != (new_labels, self.version):
+            self._build_graph(new_labels)
+            self.graph_source = (dict(new_labels), self.version)
         print(f"Engine synced with disk: {len(new_labels)} files, {len(new_cluster_names)} folders.")
+
+    def _build_graph(self, labels):
+        files = list(labels)
+        if not files:
+            self.cluster_graph = None
+            return
+        # Files without an embedding (not organized yet, or no text) still count
+        # as members; a zero row leaves their cluster's centroid direction alone
+        dim = len(next(iter(self.file_embeddings.values()), np.zeros(384)))
+        zero = np.zeros(dim)
+        embeddings = np.asarray([self.file_embeddings.get(f, zero) for f in files])
+        meta = [self.file_meta.get(f) or file_signature(f) for f in files]
+        names = {**self.cluster_names, -1: "Unsorted"}
+        self.cluster_graph = build_cluster_graph(
+            files, embeddings, np.asarray([labels[f] for f in files]), names, meta
+        )
+
+def _renamed(snapshot, renames):
+    """Copy of a merge tree or cluster graph with its 'files' and 'index' re-keyed."""
+    if snapshot is None or not any(old in snapshot['index'] for old in renames):
+        return snapshot
+    files = [renames.get(f, f) for f in snapshot['files']]
+    return dict(snapshot, files=files, index={f: i for i, f in enumerate(files)})
+
+def _top_terms(X, terms, k):
+    """Top-k terms of each row of a CSR matrix, strongest first, read straight from its arrays."""
+    n = X.shape[0]
+    rows = np.repeat(np.arange(n), np.diff(X.indptr))
+    order = np.lexsort((-X.data, rows))
+    rank = np.arange(len(order)) - X.indptr[rows[order]]
+    keep = order[rank < k]
+    top = [[] for _ in range(n)]
+    for row, col in zip(rows[keep], X.indices[keep]):
+        top[row].append(str(terms[col]))
+    return top
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Helpers for the agglomerative merge tree (sklearn's children_ / distances_).
+# Leaves are 0..n-1; merge i creates node n+i from children[i], so a parent
+# always has a higher id than its children.
+
+def cut_tree(children, distances, threshold):
+    """
+    Flat labels for the n leaves when the tree is cut at threshold, matching
+    AgglomerativeClustering(distance_threshold=threshold). O(n), no refit.
+    """
+    n = len(children) + 1
+    node_label = np.full(2 * n - 1, -1, dtype=int)
+    next_label = 0
+    # Walk from the root down; a merge below the threshold starts a cluster
+    # that all of its descendants inherit.
+    for i in range(n - 2, -1, -1):
+        node = n + i
+        if node_label[node] == -1 and distances[i] < threshold:
+            node_label[node] = next_label
+            next_label += 1
+        if node_label[node] != -1:
+            node_label[children[i]] = node_label[node]
+
+    labels = node_label[:n]
+    singletons = np.flatnonzero(labels == -1)
+    labels[singletons] = np.arange(next_label, next_label + len(singletons))
+    return labels
+
+def remove_leaf(children, distances, leaf):
+    """
+    Drops one leaf from the tree, letting its sibling take the parent's place.
+    Returns new (children, distances) with ids renumbered for n-1 leaves.
+    Remaining merge heights are kept as-is, so cuts stay stable.
+    """
+    n = len(children) + 1
+    row, side = np.argwhere(children == leaf)[0]
+    sibling = children[row, 1 - side]
+    parent = n + row
+
+    children = children.copy()
+    children[children == parent] = sibling
+    children = np.delete(children, row, axis=0)
+    distances = np.delete(distances, row)
+
+    # Old id -> new id: leaves above `leaf` shift down by one, internal
+    # nodes lose one leaf and (if above the removed merge) one merge.
+    remap = np.empty(2 * n - 1, dtype=int)
+    remap[:n] = np.arange(n) - (np.arange(n) > leaf)
+    merge_ids = np.arange(n - 1)
+    remap[n:] = (n - 1) + merge_ids - (merge_ids > row)
+    return remap[children], distances
+
+def nest_cuts(children, distances, thresholds):
+    """
+    Cuts the tree at each threshold (coarsest first) and links every cluster
+    to the cluster containing it one level up. Returns (thresholds, levels,
+    parents) with thresholds sorted descending: levels[k] is the leaf label
+    array at thresholds[k], parents[k] maps a label at level k to its label
+    at level k-1 (empty for the top level).
+    """
+    thresholds = sorted(thresholds, reverse=True)
+    levels = [cut_tree(children, distances, t) for t in thresholds]
+    parents = [{}]
+    for upper, lower in zip(levels, levels[1:]):
+        # Lower thresholds only split clusters, so any member gives the parent
+        parents.append({int(l): int(u) for l, u in zip(lower, upper)})
+    return thresholds, levels, parents
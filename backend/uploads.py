@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from mover import move_engine
+from organizer import unique_target
+
+UPLOAD_STAGING = 'upload_staging'
+UPLOAD_CHUNK = 1024 * 1024
+UPLOAD_TTL = 24 * 3600 # Seconds an unfinished session is kept after its last write
+
+class UploadSession:
+    def __init__(self, upload_id, filename, staging_path):
+        self.upload_id = upload_id
+        self.filename = filename
+        self.staging_path = staging_path
+        self.hasher = hashlib.sha256()
+        self.received = 0
+        self.touched = time.time() # Last write, as the .part file's mtime would show
+        self.lock = asyncio.Lock() # Held by the one request writing or completing it
+        self.closed = False
+
+class UploadManager:
+    """
+    Streams uploads into a staging area outside the watched root, hashing
+    each chunk as it is written. Finished files are checked against the
+    analyzer's hash index, and only new content is moved into the root
+    (as a MoveEngine batch, so the watcher ignores it). Each one is then
+    handed to the organize queue exactly once.
+
+    Resumable uploads use sessions: begin() -> append() at the reported
+    offset -> complete(). A session survives a server restart because its
+    staged bytes and filename are on disk; the hash is rebuilt from them.
+    Only one request may work on a session at a time; a second append or
+    a complete that arrives meanwhile gets ValueError. All file I/O runs
+    in the default executor, never on the event loop. Sessions with no
+    write for UPLOAD_TTL are deleted: at startup, on begin() and when a
+    stale one is looked up.
+    """
+    def __init__(self, root_dir, analyzer, organize_queue, staging_dir=UPLOAD_STAGING):
+        self.root_dir = os.path.abspath(root_dir)
+        self.analyzer = analyzer
+        self.organize_queue = organize_queue
+        self.staging_dir = os.path.abspath(staging_dir)
+        self.sessions = {}
+        self._lock = threading.Lock() # Serializes duplicate checks and landing
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._sweep()
+
+    async def begin(self, filename):
+        return await asyncio.get_running_loop().run_in_executor(None, self._begin, filename)
+
+    def _begin(self, filename):
+        self._sweep()
+        upload_id = uuid.uuid4().hex
+        session = UploadSession(upload_id, _safe_name(filename), self._part_path(upload_id))
+        with open(self._meta_path(upload_id), 'w', encoding='utf-8') as f:
+            json.dump({'filename': session.filename}, f)
+        open(session.staging_path, 'wb').close()
+        self.sessions[upload_id] = session
+        return session
+
+    async def get(self, upload_id):
+        """Returns the session, restoring it from staged files if needed. Raises KeyError."""
+        session = self.sessions.get(upload_id)
+        if session is not None:
+            if not session.lock.locked() and _expired(session.touched):
+                await asyncio.get_running_loop().run_in_executor(None, self._discard, session)
+                raise KeyError(upload_id)
+            return session
+        session = await asyncio.get_running_loop().run_in_executor(None, self._restore, upload_id)
+        # Two requests may have restored it at once; keep whichever landed first
+        return self.sessions.setdefault(upload_id, session)
+
+    def _restore(self, upload_id):
+        meta_path = self._meta_path(upload_id)
+        part_path = self._part_path(upload_id)
+        if not (os.path.exists(meta_path) and os.path.exists(part_path)):
+            raise KeyError(upload_id)
+        if _expired(os.path.getmtime(part_path)):
+            self._discard(UploadSession(upload_id, "", part_path))
+            raise KeyError(upload_id)
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            filename = json.load(f)['filename']
+        session = UploadSession(upload_id, filename, part_path)
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(UPLOAD_CHUNK), b""):
+                session.hasher.update(block)
+                session.received += len(block)
+        session.touched = os.path.getmtime(part_path)
+        return session
+
+    async def append(self, upload_id, offset, chunks):
+        """
+        Appends an async stream of byte chunks at offset. Raises KeyError for
+        an unknown session and ValueError if offset is not the current size
+        or another request is using the session.
+        """
+        session = await self.get(upload_id)
+        if session.lock.locked():
+            raise ValueError("Upload is busy with another request")
+        async with session.lock:
+            if session.closed:
+                raise KeyError(upload_id)
+            if offset != session.received:
+                raise ValueError(f"Expected offset {session.received}, got {offset}")
+            loop = asyncio.get_running_loop()
+            f = await loop.run_in_executor(None, open, session.staging_path, 'ab')
+            try:
+                async for chunk in chunks:
+                    if chunk:
+                        await loop.run_in_executor(None, _write_chunk, f, session, chunk)
+            finally:
+                await loop.run_in_executor(None, f.close)
+            return session.received
+
+    async def save(self, upload_file):
+        """Streams a multipart UploadFile through a one-shot session and completes it."""
+        session = await self.begin(upload_file.filename)
+        await self.append(session.upload_id, 0, _read_chunks(upload_file))
+        return await self.complete(session.upload_id)
+
+    async def complete(self, upload_id):
+        """
+        Finishes a session: rejects duplicates, else lands the file and queues
+        it. Raises KeyError for an unknown session and ValueError while an
+        append is still in flight.
+        """
+        session = await self.get(upload_id)
+        if session.lock.locked():
+            raise ValueError("Upload still has an append in progress")
+        async with session.lock:
+            if session.closed:
+                raise KeyError(upload_id)
+            return await asyncio.get_running_loop().run_in_executor(None, self._land, session)
+
+    def _land(self, session):
+        digest = session.hasher.hexdigest()
+        result = {"filename": session.filename, "sha256": digest, "size": session.received}
+
+        with self._lock:
+            duplicate = self.analyzer.find_duplicate(digest)
+            if duplicate:
+                self._discard(session)
+                print(f"Upload {session.filename} duplicates {duplicate}. Rejected.")
+                result.update(status="duplicate", duplicate_of=duplicate)
+                return result
+
+            target_path = unique_target(self.root_dir, session.filename, set(), suffix="upload")
+            done = move_engine.move_batch([(session.staging_path, target_path)])
+            if not done:
+                result.update(status="error")
+                return result
+            # Claim the hash now so a concurrent copy is rejected before it is organized
+            self.analyzer.record_hash(target_path, digest)
+            self._discard(session)
+
+        self.organize_queue.submit(target_path)
+        result.update(status="queued", path=target_path)
+        return result
+
+    def _discard(self, session):
+        session.closed = True
+        self.sessions.pop(session.upload_id, None)
+        for path in (session.staging_path, self._meta_path(session.upload_id)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _sweep(self):
+        """Deletes staged sessions whose .part file has not been written for UPLOAD_TTL."""
+        expired = 0
+        for name in os.listdir(self.staging_dir):
+            upload_id, ext = os.path.splitext(name)
+            part_path = self._part_path(upload_id)
+            session = self.sessions.get(upload_id)
+            if session is not None and session.lock.locked():
+                continue
+            try:
+                stale = _expired(os.path.getmtime(part_path))
+            except OSError:
+                stale = ext == '.json' # Metadata whose upload is already gone
+            if stale:
+                self._discard(session or UploadSession(upload_id, "", part_path))
+                expired += 1
+        if expired:
+            print(f"Expired {expired} abandoned upload sessions.")
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.staging_dir, f"{_safe_name(upload_id)}.part")
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self.staging_dir, f"{_safe_name(upload_id)}.json")
+
+def _write_chunk(f, session, chunk):
+    f.write(chunk)
+    session.hasher.update(chunk)
+    session.received += len(chunk)
+    session.touched = time.time()
+
+def _expired(mtime):
+    return time.time() - mtime > UPLOAD_TTL
+
+def _safe_name(name):
+    # Drop any directory components a client might send
+    return os.path.basename(name.replace('\\', '/')) or "upload"
+
+async def _read_chunks(upload_file):
+    while True:
+        chunk = await upload_file.read(UPLOAD_CHUNK)
+        if not chunk:
+            break
+        yield chunk
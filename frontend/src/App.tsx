@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect, useRef, useMemo } from 'react';
 import {
   FileText,
   FolderOpen,
@@ -73,8 +73,33 @@ interface GraphData {
   links: GraphLink[];
 }
 
+// Cluster-level summary pushed over the WebSocket (ids are folders on disk, -1 = unsorted)
+interface ClusterSummary {
+  id: number;
+  name: string;
+  count: number;
+}
+
+interface SimilarityEdge {
+  source: number | string;
+  target: number | string;
+  similarity: number;
+}
+
+// One page of a cluster's files from /graph/clusters/{id}
+interface ClusterPage {
+  cluster: number;
+  total: number;
+  files: any[];
+  edges: SimilarityEdge[];
+}
+
+const PAGE_SIZE = 100;
+
 const App: React.FC = () => {
-  const [data, setData] = useState<GraphData>({ nodes: [], links: [] });
+  const [clusters, setClusters] = useState<ClusterSummary[]>([]);
+  const [clusterEdges, setClusterEdges] = useState<SimilarityEdge[]>([]);
+  const [pages, setPages] = useState<Record<string, ClusterPage>>({}); // by folder name
   const [logs, setLogs] = useState<LogEntry[]>([]);
   const [stats, setStats] = useState({ files: 0, folders: 0 });
   const [connected, setConnected] = useState(false);
@@ -86,6 +111,11 @@ const App: React.FC = () => {
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const fileInputRef = useRef<HTMLInputElement>(null);
   const logRef = useRef<HTMLDivElement>(null);
+  // Expanded clusters are tracked by folder name (ids shift when folders come
+  // and go), each with how many of its files have been requested so far
+  const expandedRef = useRef<Map<string, number>>(new Map());
+  // Node objects are reused across updates so the force layout keeps its positions
+  const nodeCache = useRef<Map<string, GraphNode>>(new Map());
 
   const addLog = (msg: string, type: LogEntry['type'] = 'info') => {
     setLogs(prev => [...prev.slice(-49), {
@@ -100,72 +130,184 @@ const App: React.FC = () => {
   }, [logs]);
 
   useEffect(() => {
-    const ws = new WebSocket('ws://localhost:8001/ws');
+    // Reconnect with backoff; the server also drops clients that stop reading
+    let ws: WebSocket;
+    let retry: ReturnType<typeof setTimeout> | undefined;
+    let delay = 1000;
+    let stopped = false;
+
+    const connect = () => {
+      ws = new WebSocket('ws://localhost:8001/ws');
+
+      ws.onopen = () => {
+        delay = 1000;
+        setConnected(true);
+        addLog('Connected to semantic engine', 'success');
+      };
+
+      ws.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'state') {
+          const { clusters: summary, edges, total_files, pipeline: pipe, algorithm: alg } = message.data;
+          setPipeline(pipe);
+          if (alg) setAlgorithm(alg as any);
+
+          setClusters(summary);
+          setClusterEdges(edges);
+          setStats({ files: total_files, folders: summary.filter((c: ClusterSummary) => c.id !== -1).length });
+
+          // Refresh the pages of expanded clusters; forget ones that are gone
+          const byName = new Map<string, ClusterSummary>(summary.map((c: ClusterSummary) => [c.name, c]));
+          expandedRef.current.forEach((_, name) => {
+            const cluster = byName.get(name);
+            if (cluster) refreshCluster(cluster);
+            else expandedRef.current.delete(name);
+          });
+          setPages(prev => Object.fromEntries(Object.entries(prev).filter(([name]) => byName.has(name))));
+          addLog(`Synchronized: ${total_files} files in ${summary.length} clusters`, 'system');
+        } else if (message.type === 'log') {
+          addLog(message.message, 'info');
+        }
+      };
+
+      ws.onclose = () => {
+        setConnected(false);
+        if (stopped) return;
+        addLog(`Connection lost. Retrying in ${delay / 1000}s...`, 'warning');
+        retry = setTimeout(connect, delay);
+        delay = Math.min(delay * 2, 30000);
+      };
+    };
 
-    ws.onopen = () => {
-      setConnected(true);
-      addLog('Connected to semantic engine', 'success');
+    connect();
+    return () => {
+      stopped = true;
+      clearTimeout(retry);
+      ws.close();
     };
+  }, []);
 
-    ws.onmessage = (event) => {
-      const message = JSON.parse(event.data);
-      if (message.type === 'state') {
-        const { clusters, files, pipeline: pipe, algorithm: alg } = message.data;
-        setPipeline(pipe);
-        if (alg) setAlgorithm(alg as any);
-
-        const nodes: GraphNode[] = [];
-        const links: GraphLink[] = [];
-
-        // Add Cluster Nodes
-        Object.entries(clusters).forEach(([cid, name]) => {
-          nodes.push({
-            id: `folder-${cid}`,
-            name: name as string,
-            group: 'folder',
-            clusterId: parseInt(cid)
-          });
+  const fetchClusterPage = (cluster: ClusterSummary, offset: number): Promise<ClusterPage | null> =>
+    fetch(`http://localhost:8001/graph/clusters/${cluster.id}?offset=${offset}&limit=${PAGE_SIZE}`)
+      .then(r => (r.ok ? r.json() : null));
+
+  const appendPage = (page: ClusterPage, more: ClusterPage): ClusterPage => ({
+    ...more,
+    files: [...page.files, ...more.files],
+    edges: [...page.edges, ...more.edges]
+  });
+
+  // Re-reads every page loaded so far, so a refresh keeps the list as long as it was
+  const refreshCluster = (cluster: ClusterSummary) => {
+    const loaded = expandedRef.current.get(cluster.name) || PAGE_SIZE;
+    const offsets = Array.from({ length: Math.ceil(loaded / PAGE_SIZE) }, (_, i) => i * PAGE_SIZE);
+    Promise.all(offsets.map(offset => fetchClusterPage(cluster, offset)))
+      .then(results => {
+        if (!expandedRef.current.has(cluster.name)) return;
+        const page = results[0] && results.reduce((acc, more) => (acc && more ? appendPage(acc, more) : null));
+        setPages(prev => {
+          const next = { ...prev };
+          if (page) next[cluster.name] = page;
+          else delete next[cluster.name];
+          return next;
         });
+      })
+      .catch(e => addLog(`Could not load ${cluster.name}: ${e.message}`, 'error'));
+  };
 
-        if (Array.isArray(files)) {
-          files.forEach((file: any) => {
-            nodes.push({
-              id: file.path,
-              name: file.name,
-              group: 'file',
-              clusterId: file.cluster,
-              metadata: {
-                size: file.size,
-                modified: file.modified,
-                type: file.type,
-                content: file.content
-              }
-            });
-
-            if (file.cluster !== -1) {
-              links.push({
-                source: `folder-${file.cluster}`,
-                target: file.path
-              });
-            }
-          });
-        }
+  const loadMore = (cluster: ClusterSummary) => {
+    const page = pages[cluster.name];
+    if (!page) return;
+    const offset = page.files.length;
+    expandedRef.current.set(cluster.name, offset + PAGE_SIZE);
+    fetchClusterPage(cluster, offset)
+      .then(more => {
+        if (!more || !expandedRef.current.has(cluster.name)) return;
+        setPages(prev => {
+          const current = prev[cluster.name];
+          // Skip if a refresh replaced the list meanwhile
+          if (!current || current.files.length !== offset) return prev;
+          return { ...prev, [cluster.name]: appendPage(current, more) };
+        });
+      })
+      .catch(e => addLog(`Could not load ${cluster.name}: ${e.message}`, 'error'));
+  };
 
-        setData({ nodes, links });
-        setStats({ files: files.length, folders: Object.keys(clusters).length });
-        addLog(`Synchronized: ${files.length} files organized`, 'system');
-      } else if (message.type === 'log') {
-        addLog(message.message, 'info');
-      }
-    };
+  const toggleCluster = (cluster: ClusterSummary) => {
+    if (expandedRef.current.has(cluster.name)) {
+      expandedRef.current.delete(cluster.name);
+      setPages(prev => {
+        const next = { ...prev };
+        delete next[cluster.name];
+        return next;
+      });
+    } else {
+      expandedRef.current.set(cluster.name, PAGE_SIZE);
+      refreshCluster(cluster);
+    }
+  };
 
-    ws.onclose = () => {
-      setConnected(false);
-      addLog('Connection lost. Retrying...', 'warning');
-    };
+  const cachedNode = (id: string, fields: Omit<GraphNode, 'id'>): GraphNode => {
+    const node = nodeCache.current.get(id) || { id, ...fields };
+    Object.assign(node, fields);
+    nodeCache.current.set(id, node);
+    return node;
+  };
 
-    return () => ws.close();
-  }, []);
+  const fileNode = (file: any, clusterId: number) => cachedNode(file.path, {
+    name: file.name,
+    group: 'file',
+    clusterId,
+    metadata: {
+      size: file.size,
+      modified: file.modified,
+      type: file.type,
+      content: file.content,
+      keywords: file.keywords,
+      confidence: file.confidence
+    }
+  });
+
+  // Folder nodes for every cluster, file nodes only for expanded ones
+  const data: GraphData = useMemo(() => {
+    const nodes: GraphNode[] = [];
+    const links: GraphLink[] = [];
+    const folderId = new Map<number | string, string>();
+
+    clusters.forEach(cluster => {
+      const id = `folder-${cluster.name}`;
+      folderId.set(cluster.id, id);
+      nodes.push(cachedNode(id, { name: cluster.name, group: 'folder', clusterId: cluster.id, metadata: { count: cluster.count } }));
+    });
+    clusterEdges.forEach(edge => {
+      const source = folderId.get(edge.source);
+      const target = folderId.get(edge.target);
+      if (source && target) links.push({ source, target });
+    });
+
+    clusters.forEach(cluster => {
+      const page = pages[cluster.name];
+      if (!page) return;
+      page.files.forEach(file => {
+        nodes.push(fileNode(file, cluster.id));
+        links.push({ source: `folder-${cluster.name}`, target: file.path });
+      });
+      page.edges.forEach(edge => links.push({ source: edge.source as string, target: edge.target as string }));
+    });
+
+    const live = new Set(nodes.map(n => n.id));
+    nodeCache.current.forEach((_, id) => { if (!live.has(id)) nodeCache.current.delete(id); });
+    return { nodes, links };
+  }, [clusters, clusterEdges, pages]);
+
+  const handleNodeClick = (node: GraphNode) => {
+    if (node.group === 'folder') {
+      const cluster = clusters.find(c => c.id === node.clusterId);
+      if (cluster) toggleCluster(cluster);
+    } else {
+      setSelectedNode(node);
+    }
+  };
 
   const handleFileUpload = (files: FileList | null) => {
     if (!files) return;
@@ -424,7 +566,7 @@ const App: React.FC = () => {
           {/* Quick List / Reset */}
           <div style={{ flex: 1, padding: '0 20px 20px', overflowY: 'auto' }}>
             <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '12px' }}>
-              <div style={{ fontSize: '10px', color: COLORS.textMuted, letterSpacing: '1px' }}>RECENT FILES</div>
+              <div style={{ fontSize: '10px', color: COLORS.textMuted, letterSpacing: '1px' }}>CLUSTER FILES</div>
               <button
                 onClick={runDeclutter}
                 style={{
@@ -437,6 +579,9 @@ const App: React.FC = () => {
               </button>
             </div>
             <div style={{ display: 'flex', flexDirection: 'column', gap: '6px' }}>
+              {!data.nodes.some(n => n.group === 'file') && (
+                <div style={{ fontSize: '11px', color: COLORS.textMuted }}>Click a cluster to list its files</div>
+              )}
               {data.nodes.filter(n => n.group === 'file').slice(0, 10).map((node, i) => (
                 <div
                   key={i}
@@ -512,7 +657,7 @@ const App: React.FC = () => {
                   </div>
                 </div>
                 <div style={{ width: '100%', height: '100%', background: '#000' }}>
-                  <Visualizer data={data} onNodeClick={setSelectedNode} />
+                  <Visualizer data={data} onNodeClick={handleNodeClick} />
                 </div>
               </>
             )}
@@ -533,29 +678,47 @@ const App: React.FC = () => {
 
             {activeTab === 'clusters' && (
               <div style={{ padding: '24px', display: 'grid', gridTemplateColumns: 'repeat(auto-fill, minmax(300px, 1fr))', gap: '16px', overflowY: 'auto' }}>
-                {data.nodes.filter(n => n.group === 'folder').map((folder, i) => {
-                  const items = data.nodes.filter(n => n.clusterId === folder.clusterId && n.group === 'file');
+                {clusters.map((cluster, i) => {
+                  const page = pages[cluster.name];
                   const palette = CLUSTER_PALETTE[i % CLUSTER_PALETTE.length];
                   return (
-                    <div key={i} style={{
+                    <div key={cluster.name} style={{
                       borderRadius: '12px', border: `1px solid ${palette.fill}22`,
                       background: palette.fill + '08', overflow: 'hidden'
                     }}>
-                      <div style={{ padding: '16px', background: palette.fill + '11', borderBottom: `1px solid ${palette.fill}22` }}>
+                      <div
+                        onClick={() => toggleCluster(cluster)}
+                        style={{ padding: '16px', background: palette.fill + '11', borderBottom: `1px solid ${palette.fill}22`, cursor: 'pointer' }}
+                      >
                         <div style={{ display: 'flex', alignItems: 'center', gap: '12px' }}>
                           <FolderOpen size={20} color={palette.glow} />
                           <div>
-                            <div style={{ fontSize: '12px', fontWeight: 700, color: palette.label }}>{folder.name.toUpperCase()}</div>
-                            <div style={{ fontSize: '10px', color: COLORS.textMuted }}>{items.length} ORGANIZED FILES</div>
+                            <div style={{ fontSize: '12px', fontWeight: 700, color: palette.label }}>{cluster.name.toUpperCase()}</div>
+                            <div style={{ fontSize: '10px', color: COLORS.textMuted }}>{cluster.count} ORGANIZED FILES</div>
                           </div>
                         </div>
                       </div>
                       <div style={{ padding: '12px' }}>
-                        {items.map((it, j) => (
-                          <div key={j} style={{ fontSize: '11px', color: COLORS.textSecondary, padding: '4px 0', display: 'flex', alignItems: 'center', gap: '8px' }}>
-                            <ChevronRight size={10} /> {it.name}
+                        {!page && (
+                          <div style={{ fontSize: '11px', color: COLORS.textMuted }}>Click to show files</div>
+                        )}
+                        {page?.files.map(file => (
+                          <div
+                            key={file.path}
+                            onClick={() => setSelectedNode(fileNode(file, cluster.id))}
+                            style={{ fontSize: '11px', color: COLORS.textSecondary, padding: '4px 0', display: 'flex', alignItems: 'center', gap: '8px', cursor: 'pointer' }}
+                          >
+                            <ChevronRight size={10} /> {file.name}
                           </div>
                         ))}
+                        {page && page.total > page.files.length && (
+                          <div
+                            onClick={() => loadMore(cluster)}
+                            style={{ fontSize: '10px', color: palette.label, paddingTop: '4px', cursor: 'pointer' }}
+                          >
+                            + {page.total - page.files.length} more (load {Math.min(PAGE_SIZE, page.total - page.files.length)})
+                          </div>
+                        )}
                       </div>
                     </div>
                   );
@@ -599,7 +762,7 @@ const App: React.FC = () => {
                     {selectedNode.name}
                   </div>
                   <div style={{ fontSize: '11px', color: COLORS.red, fontWeight: 600, marginTop: '2px' }}>
-                    {data.nodes.find(n => n.group === 'folder' && n.clusterId === selectedNode.clusterId)?.name || 'Unsorted'}
+                    {clusters.find(c => c.id === selectedNode.clusterId)?.name || 'Unsorted'}
                   </div>
                 </div>
               </div>
@@ -656,12 +819,12 @@ const App: React.FC = () => {
             <div>
               <div style={{ height: '4px', width: '100%', background: '#fff1', borderRadius: '2px', overflow: 'hidden', marginBottom: '8px' }}>
                 <div style={{
-                  height: '100%', width: `${(selectedNode.metadata?.confidence || 0.85) * 100}%`,
+                  height: '100%', width: `${(selectedNode.metadata?.confidence ?? 0) * 100}%`,
                   background: COLORS.cyan, boxShadow: `0 0 10px ${COLORS.cyan}44`
                 }} />
               </div>
               <div style={{ fontSize: '10px', color: COLORS.textMuted }}>
-                Semantic confidence: <span style={{ color: COLORS.textSecondary }}>{Math.round((selectedNode.metadata?.confidence || 0.85) * 100)}%</span>
+                Semantic confidence: <span style={{ color: COLORS.textSecondary }}>{Math.round((selectedNode.metadata?.confidence ?? 0) * 100)}%</span>
               </div>
             </div>
 